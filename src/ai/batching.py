@@ -0,0 +1,60 @@
+import json
+from ai.tokens import count_tokens
+
+def render_item(item_id, article, fields):
+    item = {'id': item_id}
+    for field in fields:
+        item[field] = article.get(field) or ''
+    return item
+
+def pack_batches(articles, fields, token_budget):
+    """Group articles, in order, into batches whose rendered items fit token_budget.
+
+    Returns a list of batches, each a list of (id, article, item) tuples where
+    item is the JSON-ready dict sent to the model. An article that is larger
+    than the budget on its own gets a batch of its own.
+    """
+    batches = []
+    current = []
+    used = 0
+    for idx, article in enumerate(articles):
+        item = render_item(str(idx), article, fields)
+        cost = count_tokens(json.dumps(item, ensure_ascii=False))
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current = []
+            used = 0
+        current.append((str(idx), article, item))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_prompt(items):
+    return json.dumps({'articles': items}, ensure_ascii=False)
+
+def parse_batch_response(text, expected_fields):
+    """Parse a {"results": [{"id": ..., <field>: ...}]} reply into {id: {field: value}}.
+
+    expected_fields maps each field name to the type its value must have.
+    Entries with a missing or mistyped field are left out so the caller can
+    retry just those articles one at a time.
+    """
+    data = json.loads(text)
+    results = data.get('results') if isinstance(data, dict) else None
+    if not isinstance(results, list):
+        raise ValueError("Batch response has no 'results' list")
+
+    parsed = {}
+    for entry in results:
+        if not isinstance(entry, dict) or entry.get('id') is None:
+            continue
+        values = {}
+        for field, field_type in expected_fields.items():
+            value = entry.get(field)
+            if not isinstance(value, field_type):
+                break
+            values[field] = value
+        else:
+            parsed[str(entry['id'])] = values
+    return parsed
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Cache hits whose recency updates are collected before they are written in one transaction
+ACCESS_FLUSH_INTERVAL = 100
+
+class CompletionCache:
+    """Persistent chat-completion cache stored in SQLite.
+
+    Entries are keyed by a hash of model, system prompt and user prompt. The
+    cache holds at most max_entries rows and evicts the least recently used
+    ones past that; entries older than ttl seconds are treated as misses.
+    A hit only reads the database: its new recency is kept in memory and
+    written with the next ACCESS_FLUSH_INTERVAL hits, before an eviction, or
+    on close().
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_last_access ON completions (last_access)")
+        self._conn.commit()
+        # Recency is tracked with a monotonically increasing counter rather
+        # than wall-clock time, so accesses within the same tick stay ordered.
+        self._clock = self._conn.execute("SELECT COALESCE(MAX(last_access), 0) FROM completions").fetchone()[0]
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        self._pending_access = {}
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv("OPENAI_CACHE_PATH", "completion_cache.db")
+        if not path:
+            return None
+        max_entries = int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", "10000"))
+        ttl = os.getenv("OPENAI_CACHE_TTL")
+        return cls(path, max_entries=max_entries, ttl=float(ttl) if ttl else None)
+
+    @staticmethod
+    def make_key(model, system_prompt, user_prompt):
+        digest = hashlib.sha256()
+        for part in (model, system_prompt, user_prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                # Committed together with the next write
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._pending_access.pop(key, None)
+                self._entries -= 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._clock += 1
+            self._pending_access[key] = self._clock
+            if len(self._pending_access) >= ACCESS_FLUSH_INTERVAL:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._clock += 1
+            self._pending_access.pop(key, None)
+            try:
+                self._conn.execute(
+                    "INSERT INTO completions (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, response, now, self._clock)
+                )
+                self._entries += 1
+            except sqlite3.IntegrityError:
+                # Another request stored the same prompt first
+                self._conn.execute(
+                    "UPDATE completions SET response = ?, created_at = ?, last_access = ? WHERE key = ?",
+                    (response, now, self._clock, key)
+                )
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                # Eviction has to see the recency of recent hits
+                self._flush_access()
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self._entries -= overflow
+                self.evictions += overflow
+            self._conn.commit()
+
+    def _flush_access(self):
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE completions SET last_access = ? WHERE key = ?",
+                [(clock, key) for key, clock in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def flush(self):
+        """Write the recency of recent hits to disk."""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+            self._pending_access.clear()
+            self._entries = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': self._entries
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(
+            f"Completion cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions, {stats['entries']} entries"
+        )
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,93 @@
+import os
+import zlib
+import numpy as np
+from ai.prescreen import tokenize
+from ai.preprocess import clean_content
+
+# Articles whose estimated Jaccard similarity (over word shingles of the title
+# and cleaned content) reaches this value are treated as copies of one story.
+# 0 disables near-duplicate detection.
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+
+NUM_PERM = 128
+SHINGLE_SIZE = 3
+
+# Hashes are reduced modulo a 31-bit prime so a * hash + b fits in 64 bits
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+def shingles(article):
+    words = tokenize(article.get('title')) + tokenize(clean_content(article))
+    if len(words) <= SHINGLE_SIZE:
+        grams = {' '.join(words)} if words else set()
+    else:
+        grams = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+def minhash(article, num_perm=NUM_PERM):
+    """Return the MinHash signature of an article, or None if it has no text."""
+    hashes = shingles(article)
+    if not hashes.size:
+        return None
+    return ((np.outer(_A[:num_perm], hashes) + _B[:num_perm, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+def band_parameters(threshold, num_perm=NUM_PERM):
+    # Pairs become candidates when any band matches, which happens at similarities
+    # above roughly (1/bands) ** (1/rows). Keep that cut-off well below threshold so
+    # near-threshold pairs are rarely missed; candidates are checked exactly afterwards.
+    rows, bands = 1, num_perm
+    for candidate_rows in range(1, num_perm + 1):
+        candidate_bands = num_perm // candidate_rows
+        if (1 / candidate_bands) ** (1 / candidate_rows) <= threshold * 0.85:
+            rows, bands = candidate_rows, candidate_bands
+    return rows, bands
+
+class NearDuplicateIndex:
+    """Clusters near-duplicate articles with MinHash and a banded LSH index.
+
+    Articles are added one at a time. Each cluster representative's signature is
+    split into bands and stored in one bucket per band, so a new article is only
+    compared with representatives sharing at least one band. It joins the most
+    similar one at or above threshold, or else becomes a new representative.
+    """
+
+    def __init__(self, threshold=None, num_perm=NUM_PERM):
+        self.threshold = DEDUP_THRESHOLD if threshold is None else threshold
+        self.num_perm = num_perm
+        self.rows, self.bands = band_parameters(self.threshold, num_perm)
+        self.buckets = {}
+        self.signatures = {}
+        self.clusters = {}
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, item_id, article):
+        """Index an article and return the id of the representative it duplicates, or None."""
+        signature = minhash(article, self.num_perm)
+        if signature is None:
+            return None
+        keys = self._band_keys(signature)
+        candidates = sorted({rep for key in keys for rep in self.buckets.get(key, ())})
+        best, best_similarity = None, self.threshold
+        for rep in candidates:
+            similarity = np.count_nonzero(self.signatures[rep] == signature) / self.num_perm
+            if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                best, best_similarity = rep, similarity
+        if best is not None:
+            self.clusters[best].append(item_id)
+            return best
+        self.signatures[item_id] = signature
+        self.clusters[item_id] = []
+        for key in keys:
+            self.buckets.setdefault(key, []).append(item_id)
+        return None
+
+    def duplicate_clusters(self):
+        """Return {representative id: [duplicate ids]} for clusters with more than one article."""
+        return {rep: members for rep, members in self.clusters.items() if members}
@@ -0,0 +1,107 @@
+import re
+from collections import Counter
+from ai.preprocess import clean_content, extract_text
+
+try:
+    import nltk
+    from nltk.corpus import stopwords as nltk_stopwords
+    from nltk.stem import WordNetLemmatizer
+except ImportError:
+    nltk = None
+
+# Keywords kept per article
+MAX_KEYWORDS = 8
+
+# Title words are counted this many times so they rank above body words
+TITLE_WEIGHT = 3
+
+# Used when nltk or its stopwords corpus is not installed
+FALLBACK_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just let me more most
+my myself new no nor not now of off on once one only or other our ours ourselves out over own said same
+says she should so some such than that the their theirs them themselves then there these they this
+those through to too two under until up us very via was we were what when where which while who whom
+why will with would year years you your yours yourself yourselves
+""".split())
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9+#'-]*[a-z0-9+#]|[a-z]")
+
+_stopwords = None
+_lemmatize = None
+
+def _get_stopwords():
+    global _stopwords
+    if _stopwords is None:
+        _stopwords = FALLBACK_STOPWORDS
+        if nltk is not None:
+            try:
+                _stopwords = frozenset(nltk_stopwords.words('english')) | FALLBACK_STOPWORDS
+            except LookupError:
+                pass
+    return _stopwords
+
+def _get_lemmatizer():
+    # WordNet folds plurals ("models" -> "model"); without its corpus words are kept as they are
+    global _lemmatize
+    if _lemmatize is None:
+        _lemmatize = lambda word: word
+        if nltk is not None:
+            lemmatizer = WordNetLemmatizer()
+            try:
+                lemmatizer.lemmatize('tests')
+                _lemmatize = lemmatizer.lemmatize
+            except LookupError:
+                pass
+    return _lemmatize
+
+def extract_keywords(article, max_keywords=MAX_KEYWORDS, text=None):
+    """Return up to max_keywords keywords for an article, best first.
+
+    Candidates are words and two-word phrases that are not interrupted by a
+    stopword, scored by frequency with title occurrences weighted higher.
+    Phrases must occur at least twice. Nothing is sent to the LLM. text is
+    the article's cleaned content, if the caller already has it.
+    """
+    stopwords = _get_stopwords()
+    lemmatize = _get_lemmatizer()
+    counts = Counter()
+    occurrences = Counter()
+    sources = (
+        (article.get('title'), TITLE_WEIGHT),
+        (article.get('summary'), 1),
+        (extract_text(article.get('content')) if text is None else text, 1)
+    )
+    for text, weight in sources:
+        previous = None
+        for word in _WORD_RE.findall((text or '').lower()):
+            if len(word) < 3 or word in stopwords:
+                previous = None
+                continue
+            word = lemmatize(word)
+            counts[word] += weight
+            if previous is not None:
+                phrase = f"{previous} {word}"
+                counts[phrase] += weight
+                occurrences[phrase] += 1
+            previous = word
+    candidates = [term for term in counts if ' ' not in term or occurrences[term] >= 2]
+    # On equal scores a phrase ranks above the single words it contains
+    candidates.sort(key=lambda term: (-counts[term], -term.count(' '), term))
+    return candidates[:max_keywords]
+
+def build_keyword_index(articles, index, sources=None):
+    """Add articles to a KeywordIndex, skipping those already indexed unchanged.
+
+    sources optionally lists the parsed articles the processed ones were made
+    from, in the same order, so their cleaned content is reused.
+    """
+    added = 0
+    for position, article in enumerate(articles):
+        if index.contains(article):
+            continue
+        text = clean_content(sources[position]) if sources is not None else None
+        index.add(article, extract_keywords(article, text=text))
+        added += 1
+    return added
@@ -1,124 +1,625 @@
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import functools
 import logging
+import time
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-from parsers.xml_parser import parse_user_xml
+from openai import AsyncOpenAI
+from ai.batching import build_batch_prompt, pack_batches, parse_batch_response
+from ai.cache import CompletionCache
+from ai.dedup import DEDUP_THRESHOLD, NearDuplicateIndex
+from ai.prescreen import prescreen
+from ai.preprocess import TokenSavings, clean_content, prepare_content
+from ai.scheduler import COMPLETION_TOKEN_ESTIMATE, RequestScheduler
+from ai.tokens import count_tokens
+from data_structures.article_store import ArticleStore
+from parsers.xml_parser import iter_user_xml, parse_user_xml
+from utils.metrics import metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize OpenAI client with API key from environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+MODEL = "gpt-4o-mini"
 
-def ai_summarize(content):
+SUMMARY_UNAVAILABLE = "Summary not available."
+
+# Maximum number of chat completions in flight at once for a single feed operation
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+
+# Token budget for the articles packed into one batched request; 0 sends one article per request
+BATCH_TOKEN_BUDGET = int(os.getenv("OPENAI_BATCH_TOKEN_BUDGET", "0"))
+
+# Plain-text completions are requested with stream=True; JSON-mode batches are not
+STREAM_RESPONSES = os.getenv("OPENAI_STREAM", "1") != "0"
+
+# The async client is bound to the event loop it was first used on, so each
+# event loop gets its own client through this context variable.
+_async_client = contextvars.ContextVar("async_client", default=None)
+
+# Optional semaphore capping chat completions in flight across every caller in a scope
+_request_slots = contextvars.ContextVar("request_slots", default=None)
+
+def _new_async_client():
+    # Retries are left to the request scheduler, which coordinates them across requests
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+def get_async_client():
+    client = _async_client.get()
+    if client is None:
+        client = _new_async_client()
+        _async_client.set(client)
+    return client
+
+@contextlib.asynccontextmanager
+async def async_client_scope(max_in_flight=None):
+    client = _new_async_client()
+    token = _async_client.set(client)
+    slots_token = _request_slots.set(asyncio.Semaphore(max_in_flight) if max_in_flight else None)
     try:
-        chat_completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes articles."},
-                {"role": "user", "content": f"Summarize this article in 2-3 sentences: {content}"}
-            ]
-        )
-        summary = chat_completion.choices[0].message.content
-        logging.info("Summarization successful.")
-        return summary
-    except Exception as e:
-        logging.error(f"Error during summarization: {e}")
-        return "Summary not available."
-
-def process_user_feed(xml_content):
-    articles = parse_user_xml(xml_content)
-    processed_articles = []
-
-    for article in articles:
-        summary = ai_summarize(article['content'])
-        processed_article = {
-            'title': article['title'],
-            'content': article['content'],
-            'summary': summary,
-            'url': article['url']
-        }
-        processed_articles.append(processed_article)
-
-    return processed_articles
-
-def translate_feed(articles, target_language):
-    translated_articles = []
-    for article in articles:
+        yield client
+    finally:
+        _request_slots.reset(slots_token)
+        _async_client.reset(token)
+        await client.close()
+
+def run_async(func, *args, **kwargs):
+    async def runner():
+        async with async_client_scope():
+            return await func(*args, **kwargs)
+    return asyncio.run(runner())
+
+_completion_cache = None
+_completion_cache_loaded = False
+
+def get_completion_cache():
+    global _completion_cache, _completion_cache_loaded
+    if not _completion_cache_loaded:
+        _completion_cache = CompletionCache.from_env()
+        _completion_cache_loaded = True
+        if _completion_cache is not None:
+            # Writes out the recency of hits not flushed yet
+            atexit.register(_completion_cache.close)
+    return _completion_cache
+
+_article_store = None
+_article_store_loaded = False
+
+def get_article_store():
+    global _article_store, _article_store_loaded
+    if not _article_store_loaded:
+        _article_store = ArticleStore.from_env()
+        _article_store_loaded = True
+        if _article_store is not None:
+            # Writes out the last_seen of reused summaries not flushed yet
+            atexit.register(_article_store.close)
+    return _article_store
+
+_request_scheduler = None
+
+def get_request_scheduler():
+    global _request_scheduler
+    if _request_scheduler is None:
+        _request_scheduler = RequestScheduler()
+    return _request_scheduler
+
+def log_cache_stats():
+    # Only report on a cache this run actually opened
+    if _completion_cache_loaded and _completion_cache is not None:
+        _completion_cache.log_stats()
+
+def _timed(name, **labels):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with metrics.timer(name, **labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+async def _read_stream(stream, start, stage):
+    # Returns (text, usage); usage arrives in a final chunk without choices
+    parts = []
+    usage = None
+    async for chunk in stream:
+        if getattr(chunk, 'usage', None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not parts:
+                metrics.observe('llm_first_token_seconds', time.perf_counter() - start, stage=stage)
+            parts.append(delta)
+    return ''.join(parts), usage
+
+async def _send_request(model, system_prompt, user_prompt, kwargs, stream, stage):
+    # One attempt; returns (text, usage, headers)
+    slots = _request_slots.get()
+    async with slots if slots is not None else contextlib.nullcontext():
+        start = time.perf_counter()
         try:
-            chat_completion = client.chat.completions.create(
-                model="gpt-4o-mini",
+            raw_response = await get_async_client().chat.completions.with_raw_response.create(
+                model=model,
                 messages=[
-                    {"role": "system", "content": f"You are a translator. Translate the following text to {target_language}. Maintain the original structure with 'Title:', 'Content:', and 'Summary:' labels."},
-                    {"role": "user", "content": f"Title: {article['title']}\n\nContent: {article['content']}\n\nSummary: {article['summary']}"}
-                ]
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                **kwargs
             )
-            translated_text = chat_completion.choices[0].message.content
-            logging.info(f"Received translation:\n{translated_text}")
-            
-            # Split the text and handle potential formatting issues
-            parts = translated_text.split('\n\n')
-            translated_article = {
-                'title': article['title'],
-                'content': article['content'],
-                'summary': article['summary'],
-                'url': article['url']
-            }
-            
-            for part in parts:
-                if part.startswith('Title:'):
-                    translated_article['title'] = part.replace('Title:', '').strip()
-                elif part.startswith('Content:'):
-                    translated_article['content'] = part.replace('Content:', '').strip()
-                elif part.startswith('Summary:'):
-                    translated_article['summary'] = part.replace('Summary:', '').strip()
-            
-            translated_articles.append(translated_article)
-            
-        except Exception as e:
-            logging.error(f"Error during translation: {e}")
-            translated_articles.append(article)  # Keep the original article if translation fails
-    return translated_articles
+            chat_completion = raw_response.parse()
+            if stream:
+                response, usage = await _read_stream(chat_completion, start, stage)
+            else:
+                response = chat_completion.choices[0].message.content
+                usage = getattr(chat_completion, 'usage', None)
+        except Exception:
+            metrics.increment('llm_errors_total', stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe('llm_request_seconds', elapsed, stage=stage)
+    metrics.increment('llm_requests_total', stage=stage)
+    metrics.record_usage(usage, stage=stage)
+    if usage is not None:
+        logging.debug(f"{stage} request took {elapsed:.2f}s ({usage.prompt_tokens} prompt + {usage.completion_tokens} completion tokens)")
+    return response, usage, raw_response.headers
+
+async def _chat_completion(system_prompt, user_prompt, model=MODEL, json_mode=False, stage='chat', slots=None):
+    # slots optionally caps the requests in flight for one feed operation
+    cache = get_completion_cache()
+    key = None
+    if cache is not None:
+        key = CompletionCache.make_key(model, system_prompt, user_prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.increment('llm_cache_hits_total', stage=stage)
+            return cached
 
-def apply_slang(articles, slang_style):
-    slang_articles = []
-    for article in articles:
+    kwargs = {}
+    stream = STREAM_RESPONSES and not json_mode
+    if json_mode:
+        kwargs['response_format'] = {"type": "json_object"}
+    if stream:
+        kwargs['stream'] = True
+        kwargs['stream_options'] = {"include_usage": True}
+    scheduler = get_request_scheduler()
+    estimated_tokens = count_tokens(system_prompt) + count_tokens(user_prompt) + COMPLETION_TOKEN_ESTIMATE
+    attempt = 0
+    while True:
         try:
-            chat_completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": f"You are an expert in {slang_style} slang. Rewrite the following text in {slang_style} style."},
-                    {"role": "user", "content": f"Title: {article['title']}\n\nSummary: {article['summary']}"}
-                ]
-            )
-            slang_text = chat_completion.choices[0].message.content
-            title, summary = slang_text.split('\n\n')
-            slang_articles.append({
-                'title': title.replace('Title: ', ''),
-                'content': article['content'],
-                'summary': summary.replace('Summary: ', ''),
-                'url': article['url']
-            })
+            async with slots if slots is not None else contextlib.nullcontext():
+                queued = time.perf_counter()
+                await scheduler.acquire(estimated_tokens, stage)
+                metrics.observe('llm_queue_seconds', time.perf_counter() - queued, stage=stage)
+                response, usage, headers = await _send_request(model, system_prompt, user_prompt, kwargs, stream, stage)
+            break
         except Exception as e:
-            logging.error(f"Error during slang application: {e}")
-            slang_articles.append(article)
-    return slang_articles
+            delay = scheduler.retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            metrics.increment('llm_retries_total', stage=stage, error=type(e).__name__)
+            logging.warning(f"{stage} request failed ({e}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+    used_tokens = getattr(usage, 'total_tokens', None) if usage is not None else None
+    scheduler.record_response(headers, estimated_tokens, used_tokens)
+    if cache is not None and response is not None:
+        cache.set(key, response)
+    return response
+
+async def _gather_ordered(items, worker, concurrency=None):
+    # asyncio.gather returns results in the order of its arguments, so the
+    # output lines up with the input no matter which request finishes first.
+    semaphore = asyncio.Semaphore(concurrency or MAX_CONCURRENCY)
 
-def filter_feed(articles, keyword):
-    filtered_articles = []
-    for article in articles:
+    async def run(item):
+        async with semaphore:
+            return await worker(item)
+
+    tasks = []
+    for item in items:
+        tasks.append(asyncio.create_task(run(item)))
+        # items may be a generator that is still reading its input, so give
+        # the queued requests a chance to start before pulling the next item
+        await asyncio.sleep(0)
+    return await asyncio.gather(*tasks)
+
+async def _run_batched(articles, system_prompt, fields, expected_fields, apply, fallback, token_budget, concurrency=None, stage='batch'):
+    # Pack articles into JSON requests of up to token_budget tokens. Articles the
+    # model leaves out or answers malformed are retried one at a time with fallback.
+    batches = pack_batches(articles, fields, token_budget)
+
+    async def run(batch):
+        if len(batch) == 1:
+            return [await fallback(batch[0][1])]
+        parsed = {}
         try:
-            chat_completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant that determines if an article is relevant to a given keyword. Respond with 'Yes' if relevant, 'No' if not."},
-                    {"role": "user", "content": f"Keyword: {keyword}\n\nArticle Title: {article['title']}\n\nArticle Content: {article['content']}\n\nIs this article relevant to the keyword?"}
-                ]
+            response = await _chat_completion(
+                system_prompt,
+                build_batch_prompt([item for _, _, item in batch]),
+                json_mode=True,
+                stage=stage
             )
-            response = chat_completion.choices[0].message.content.strip().lower()
-            if response == 'yes':
-                filtered_articles.append(article)
+            parsed = parse_batch_response(response, expected_fields)
         except Exception as e:
-            logging.error(f"Error during relevance check: {e}")
-            filtered_articles.append(article)  # Include the article if there's an error, to be safe
-    return filtered_articles
+            logging.error(f"Error during batched request: {e}")
+        missing = [article for item_id, article, _ in batch if item_id not in parsed]
+        if missing:
+            logging.warning(f"Batch response covered {len(batch) - len(missing)} of {len(batch)} articles, retrying the rest individually")
+        retried = iter(await asyncio.gather(*(fallback(article) for article in missing)))
+        return [
+            apply(article, parsed[item_id]) if item_id in parsed else next(retried)
+            for item_id, article, _ in batch
+        ]
+
+    results = await _gather_ordered(batches, run, concurrency)
+    return [result for batch in results for result in batch]
+
+async def ai_summarize_async(content, savings=None, text=None, slots=None):
+    try:
+        # Markup is stripped first (text, when given, is the already cleaned content);
+        # articles over the token budget are summarized chunk by chunk in parallel
+        # and the partial summaries combined
+        chunks, raw_tokens, sent_tokens = prepare_content(content, text=text)
+        if savings is not None:
+            savings.add(raw_tokens, sent_tokens, len(chunks))
+        if len(chunks) <= 1:
+            summary = await _chat_completion(
+                "You are a helpful assistant that summarizes articles.",
+                f"Summarize this article in 2-3 sentences: {chunks[0] if chunks else ''}",
+                stage='summarize',
+                slots=slots
+            )
+        else:
+            partial_summaries = await asyncio.gather(*(
+                _chat_completion(
+                    "You are a helpful assistant that summarizes articles.",
+                    f"Summarize part {number} of {len(chunks)} of this article in 2-3 sentences: {chunk}",
+                    stage='summarize',
+                    slots=slots
+                )
+                for number, chunk in enumerate(chunks, 1)
+            ))
+            combined = '\n\n'.join(partial_summaries)
+            summary = await _chat_completion(
+                "You are a helpful assistant that summarizes articles.",
+                f"These are summaries of consecutive parts of one article. Combine them into a single 2-3 sentence summary of the article:\n\n{combined}",
+                stage='summarize',
+                slots=slots
+            )
+        logging.info("Summarization successful.")
+        return summary
+    except Exception as e:
+        logging.error(f"Error during summarization: {e}")
+        return SUMMARY_UNAVAILABLE
+
+async def summarize_article_async(article, savings=None, slots=None):
+    """Return (processed_article, summarized) for one parsed article.
+
+    Entries already in the article store with the same content keep their
+    stored summary, in which case summarized is False. slots, an optional
+    semaphore, caps the requests in flight, including those for the chunks
+    of a long article.
+    """
+    store = get_article_store()
+    summary = store.get_summary(article) if store is not None else None
+    summarized = summary is None
+    if summarized:
+        summary = await ai_summarize_async(article['content'], savings, clean_content(article), slots)
+        if store is not None and summary != SUMMARY_UNAVAILABLE:
+            store.save_summary(article, summary)
+    processed_article = {
+        'title': article['title'],
+        'content': article['content'],
+        'summary': summary,
+        'url': article['url']
+    }
+    return processed_article, summarized
+
+def duplicate_article(article, processed_representative):
+    # Near-duplicates of an earlier article reuse its summary
+    return {
+        'title': article['title'],
+        'content': article['content'],
+        'summary': processed_representative['summary'],
+        'url': article['url'],
+        'duplicate_of': processed_representative['url']
+    }
+
+async def iter_user_feed_async(xml_content, concurrency=None, dedup_threshold=None):
+    """Summarize a feed and yield (index, processed_article) as each article completes.
+
+    index is the article's position in the feed; articles arrive in completion
+    order. xml_content is XML text, a stream (file object or byte chunks) or a
+    list of already parsed articles. Streams are parsed incrementally so the
+    first entries are summarized while the rest of the feed is still being read.
+    """
+    if isinstance(xml_content, str):
+        articles = parse_user_xml(xml_content)
+    elif isinstance(xml_content, list):
+        articles = xml_content
+    else:
+        articles = iter_user_xml(xml_content)
+
+    store = get_article_store()
+    if store is not None:
+        store.reset_counters()
+    savings = TokenSavings()
+    threshold = DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+    dedup = NearDuplicateIndex(threshold) if threshold > 0 else None
+    semaphore = asyncio.Semaphore(concurrency or MAX_CONCURRENCY)
+    # A long article is summarized with one request per chunk, so requests are capped too
+    requests_in_flight = asyncio.Semaphore(concurrency or MAX_CONCURRENCY)
+    completed = asyncio.Queue()
+    representatives = {}
+    tasks = []
+
+    async def summarize(article):
+        async with semaphore:
+            processed_article, _ = await summarize_article_async(article, savings, requests_in_flight)
+        return processed_article
+
+    async def copy(article, representative):
+        processed_representative = await representatives[representative]
+        processed_representative.setdefault('duplicates', []).append(article['url'])
+        return duplicate_article(article, processed_representative)
+
+    def produce():
+        count = 0
+        try:
+            for idx, article in enumerate(articles):
+                representative = dedup.add(idx, article) if dedup is not None else None
+                if representative is None:
+                    task = representatives[idx] = asyncio.create_task(summarize(article))
+                else:
+                    task = asyncio.create_task(copy(article, representative))
+                task.add_done_callback(lambda task, idx=idx: completed.put_nowait((idx, task)))
+                tasks.append(task)
+                count += 1
+                yield
+        finally:
+            completed.put_nowait((None, count))
+
+    async def run_producer():
+        # articles may be a generator that is still reading its input, so give
+        # the queued requests a chance to start before pulling the next item
+        for _ in produce():
+            await asyncio.sleep(0)
+
+    producer = asyncio.create_task(run_producer())
+    total = None
+    yielded = 0
+    try:
+        while total is None or yielded < total:
+            idx, result = await completed.get()
+            if idx is None:
+                # The producer is done; re-raise its error, if any
+                await producer
+                total = result
+                continue
+            yielded += 1
+            yield idx, result.result()
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+    savings.log()
+    clusters = dedup.duplicate_clusters() if dedup is not None else {}
+    if clusters:
+        duplicates = sum(len(members) for members in clusters.values())
+        metrics.increment('dedup_skipped_total', duplicates)
+        logging.info(f"Near-duplicates: {duplicates} of {total} articles reuse the summary of one of {len(clusters)} representatives")
+    if store is not None:
+        stats = store.stats()
+        logging.info(f"Article store: summarized {stats['processed']} new or changed entries, skipped {stats['skipped']} unchanged")
+        store.compact()
+
+@_timed('transform_seconds', transform='summarize')
+async def process_user_feed_async(xml_content, concurrency=None, dedup_threshold=None, on_result=None):
+    # on_result(index, processed_article) is called as each article completes;
+    # the returned list is in feed order
+    processed = {}
+    async for idx, processed_article in iter_user_feed_async(xml_content, concurrency, dedup_threshold):
+        processed[idx] = processed_article
+        if on_result is not None:
+            on_result(idx, processed_article)
+    return [processed[idx] for idx in range(len(processed))]
+
+def _parse_labeled_sections(text, article):
+    # Split the text and handle potential formatting issues
+    parts = text.split('\n\n')
+    # Start from a copy so fields such as duplicate_of survive the rewrite
+    rewritten_article = dict(article)
+
+    for part in parts:
+        if part.startswith('Title:'):
+            rewritten_article['title'] = part.replace('Title:', '').strip()
+        elif part.startswith('Content:'):
+            rewritten_article['content'] = part.replace('Content:', '').strip()
+            rewritten_article.pop('clean_content', None)
+        elif part.startswith('Summary:'):
+            rewritten_article['summary'] = part.replace('Summary:', '').strip()
+
+    return rewritten_article
+
+async def _translate_article(article, target_language):
+    try:
+        translated_text = await _chat_completion(
+            f"You are a translator. Translate the following text to {target_language}. Maintain the original structure with 'Title:', 'Content:', and 'Summary:' labels.",
+            f"Title: {article['title']}\n\nContent: {article['content']}\n\nSummary: {article['summary']}",
+            stage='translate'
+        )
+        logging.info(f"Received translation:\n{translated_text}")
+        return _parse_labeled_sections(translated_text, article)
+
+    except Exception as e:
+        logging.error(f"Error during translation: {e}")
+        return article  # Keep the original article if translation fails
+
+def _merge_fields(article, values):
+    merged = dict(article)
+    merged.update(values)
+    if 'content' in values:
+        merged.pop('clean_content', None)
+    return merged
+
+@_timed('transform_seconds', transform='translate')
+async def translate_feed_async(articles, target_language, concurrency=None, token_budget=None):
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    if token_budget:
+        return await _run_batched(
+            list(articles),
+            f"You are a translator. Translate the title, content and summary of each article to {target_language}. "
+            "The user sends a JSON object with an 'articles' list whose items have an 'id', 'title', 'content' and 'summary'. "
+            'Respond with a JSON object {"results": [{"id": ..., "title": ..., "content": ..., "summary": ...}]} '
+            "containing one result per article, using the same ids.",
+            ('title', 'content', 'summary'),
+            {'title': str, 'content': str, 'summary': str},
+            _merge_fields,
+            lambda article: _translate_article(article, target_language),
+            token_budget,
+            concurrency,
+            stage='translate_batch'
+        )
+    return await _gather_ordered(articles, lambda article: _translate_article(article, target_language), concurrency)
+
+async def _slang_article(article, slang_style):
+    try:
+        slang_text = await _chat_completion(
+            f"You are an expert in {slang_style} slang. Rewrite the following text in {slang_style} style.",
+            f"Title: {article['title']}\n\nSummary: {article['summary']}",
+            stage='slang'
+        )
+        title, summary = slang_text.split('\n\n')
+        slang_article = dict(article)
+        slang_article.update(title=title.replace('Title: ', ''), summary=summary.replace('Summary: ', ''))
+        return slang_article
+    except Exception as e:
+        logging.error(f"Error during slang application: {e}")
+        return article
+
+@_timed('transform_seconds', transform='slang')
+async def apply_slang_async(articles, slang_style, concurrency=None, token_budget=None):
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    if token_budget:
+        return await _run_batched(
+            list(articles),
+            f"You are an expert in {slang_style} slang. Rewrite the title and summary of each article in {slang_style} style. "
+            "The user sends a JSON object with an 'articles' list whose items have an 'id', 'title' and 'summary'. "
+            'Respond with a JSON object {"results": [{"id": ..., "title": ..., "summary": ...}]} '
+            "containing one result per article, using the same ids.",
+            ('title', 'summary'),
+            {'title': str, 'summary': str},
+            _merge_fields,
+            lambda article: _slang_article(article, slang_style),
+            token_budget,
+            concurrency,
+            stage='slang_batch'
+        )
+    return await _gather_ordered(articles, lambda article: _slang_article(article, slang_style), concurrency)
+
+def _rewrite_instruction(step):
+    kind, argument = step
+    if kind == 'translate':
+        return f"Translate the title, content and summary to {argument}."
+    if kind == 'slang':
+        return f"Rewrite the title and summary in {argument} slang style."
+    raise ValueError(f"Unknown rewrite step: {kind}")
+
+async def _rewrite_article(article, steps):
+    instructions = '\n'.join(f"{number}. {_rewrite_instruction(step)}" for number, step in enumerate(steps, 1))
+    try:
+        rewritten_text = await _chat_completion(
+            f"You rewrite articles by applying these steps in order:\n{instructions}\n"
+            "Reply with only the final result, keeping the 'Title:', 'Content:' and 'Summary:' labels and separating the sections with a blank line.",
+            f"Title: {article['title']}\n\nContent: {article['content']}\n\nSummary: {article['summary']}",
+            stage='rewrite'
+        )
+        logging.info(f"Received rewrite:\n{rewritten_text}")
+        return _parse_labeled_sections(rewritten_text, article)
+    except Exception as e:
+        logging.error(f"Error during rewrite: {e}")
+        return article
+
+@_timed('article_transform_seconds', transform='rewrite')
+async def rewrite_article_async(article, steps):
+    # A single step keeps its dedicated prompt, a chain is fused into one request
+    steps = list(steps)
+    if len(steps) == 1:
+        kind, argument = steps[0]
+        if kind == 'translate':
+            return await _translate_article(article, argument)
+        if kind == 'slang':
+            return await _slang_article(article, argument)
+    return await _rewrite_article(article, steps)
+
+@_timed('transform_seconds', transform='rewrite')
+async def rewrite_feed_async(articles, steps, concurrency=None):
+    """Apply a chain of ('translate', language) / ('slang', style) steps with one request per article."""
+    steps = list(steps)
+    return await _gather_ordered(articles, lambda article: _rewrite_article(article, steps), concurrency)
+
+async def _is_relevant(article, keyword):
+    try:
+        response = await _chat_completion(
+            "You are an AI assistant that determines if an article is relevant to a given keyword. Respond with 'Yes' if relevant, 'No' if not.",
+            f"Keyword: {keyword}\n\nArticle Title: {article['title']}\n\nArticle Content: {article['content']}\n\nIs this article relevant to the keyword?",
+            stage='filter'
+        )
+        response = response.strip().lower()
+        return response == 'yes'
+    except Exception as e:
+        logging.error(f"Error during relevance check: {e}")
+        return True  # Include the article if there's an error, to be safe
+
+@_timed('transform_seconds', transform='filter')
+async def filter_feed_async(articles, keyword, concurrency=None, use_prescreen=True, token_budget=None):
+    articles = list(articles)
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    # Articles the local pre-screen is confident about never reach the LLM
+    decisions = prescreen(articles, keyword) if use_prescreen else [None] * len(articles)
+    ambiguous = [idx for idx, decision in enumerate(decisions) if decision is None]
+    if token_budget:
+        relevant = await _run_batched(
+            [articles[idx] for idx in ambiguous],
+            f"You are an AI assistant that determines if articles are relevant to the keyword '{keyword}'. "
+            "The user sends a JSON object with an 'articles' list whose items have an 'id', 'title' and 'content'. "
+            'Respond with a JSON object {"results": [{"id": ..., "relevant": true or false}]} '
+            "containing one result per article, using the same ids.",
+            ('title', 'content'),
+            {'relevant': bool},
+            lambda article, values: values['relevant'],
+            lambda article: _is_relevant(article, keyword),
+            token_budget,
+            concurrency,
+            stage='filter_batch'
+        )
+    else:
+        relevant = await _gather_ordered(ambiguous, lambda idx: _is_relevant(articles[idx], keyword), concurrency)
+    for idx, keep in zip(ambiguous, relevant):
+        decisions[idx] = keep
+    return [article for article, keep in zip(articles, decisions) if keep]
+
+# Synchronous entry points used by main.py; each one runs the async engine to completion.
+
+def ai_summarize(content):
+    return run_async(ai_summarize_async, content)
+
+def process_user_feed(xml_content, concurrency=None, dedup_threshold=None, on_result=None):
+    return run_async(process_user_feed_async, xml_content, concurrency, dedup_threshold, on_result)
+
+def translate_feed(articles, target_language, concurrency=None, token_budget=None):
+    return run_async(translate_feed_async, articles, target_language, concurrency, token_budget)
+
+def apply_slang(articles, slang_style, concurrency=None, token_budget=None):
+    return run_async(apply_slang_async, articles, slang_style, concurrency, token_budget)
+
+def rewrite_feed(articles, steps, concurrency=None):
+    return run_async(rewrite_feed_async, articles, steps, concurrency)
+
+def filter_feed(articles, keyword, concurrency=None, use_prescreen=True, token_budget=None):
+    return run_async(filter_feed_async, articles, keyword, concurrency, use_prescreen, token_budget)
@@ -0,0 +1,102 @@
+import logging
+from ai.openai_utils import apply_slang, filter_feed, rewrite_feed, translate_feed
+
+REWRITE_STEPS = ('translate', 'slang')
+
+def order_steps(steps):
+    """Split steps into (filters, rewrites), each keeping its original order.
+
+    Filters look at the original title and content rather than the
+    rewritten ones; the relevance check does not depend on language or
+    style, and this way rewrites only run on articles that are kept.
+    """
+    filters = [step for step in steps if step[0] == 'filter']
+    rewrites = [step for step in steps if step[0] in REWRITE_STEPS]
+    return filters, rewrites
+
+class TransformPlan:
+    """Deferred chain of filter/translate/slang steps over a list of articles.
+
+    Steps are only recorded until materialize() is called. Before running,
+    filters are moved ahead of rewrites so dropped articles are never
+    rewritten. Results are memoized per prefix of the reordered plan, so
+    showing the same plan twice costs nothing. Of the rewrites still to run,
+    the newest runs on its own so that undoing it is free; the ones before it
+    are fused into one request per article. Two new rewrites therefore cost
+    as many requests as running them separately, and undoing a step that was
+    fused re-runs the remaining ones.
+
+    The transform callables default to the functions in ai.openai_utils and
+    can be replaced, e.g. by the caller's own imports.
+    """
+
+    def __init__(self, articles, filter_fn=filter_feed, translate_fn=translate_feed,
+                 slang_fn=apply_slang, rewrite_fn=rewrite_feed):
+        self.articles = articles
+        self.steps = []
+        self._filter = filter_fn
+        self._translate = translate_fn
+        self._slang = slang_fn
+        self._rewrite = rewrite_fn
+        self._memo = {}
+
+    def filter(self, keyword):
+        self.steps.append(('filter', keyword))
+
+    def translate(self, target_language):
+        self.steps.append(('translate', target_language))
+
+    def slang(self, slang_style):
+        self.steps.append(('slang', slang_style))
+
+    def undo(self):
+        return self.steps.pop() if self.steps else None
+
+    def optimize(self):
+        """Return the steps in execution order: every filter first, then the rewrites."""
+        filters, rewrites = order_steps(self.steps)
+        return filters + rewrites
+
+    def _run_rewrites(self, steps, articles):
+        # A single rewrite keeps its dedicated prompt (and batching support),
+        # consecutive ones are fused into one request per article
+        if len(steps) > 1:
+            return self._rewrite(articles, steps)
+        kind, argument = steps[0]
+        if kind == 'translate':
+            return self._translate(articles, argument)
+        return self._slang(articles, argument)
+
+    def _key(self, prefix, limit):
+        # Filters always run over every article; rewrites only over the first limit survivors
+        has_rewrite = any(kind in REWRITE_STEPS for kind, _ in prefix)
+        return (tuple(prefix), limit if has_rewrite else None)
+
+    def materialize(self, limit=None):
+        """Run the plan and return its articles, only rewriting the first limit of them if given."""
+        plan = self.optimize()
+        # Resume from the longest prefix that has already been computed
+        start = len(plan)
+        while start > 0 and self._key(plan[:start], limit) not in self._memo:
+            start -= 1
+        articles = self._memo[self._key(plan[:start], limit)] if start else self.articles
+        if start < len(plan):
+            logging.info(f"Executing {len(plan) - start} of {len(plan)} plan steps")
+
+        position = start
+        while position < len(plan) and plan[position][0] == 'filter':
+            if articles:
+                articles = self._filter(articles, plan[position][1])
+            position += 1
+            self._memo[self._key(plan[:position], limit)] = articles
+        if position < len(plan):
+            articles = articles[:limit] if limit is not None else articles
+            # Everything but the newest rewrite is fused and memoized, so undo can fall back to it
+            if len(plan) - position > 1:
+                if articles:
+                    articles = self._run_rewrites(plan[position:-1], articles)
+                self._memo[self._key(plan[:-1], limit)] = articles
+            if articles:
+                articles = self._run_rewrites(plan[-1:], articles)
+            self._memo[self._key(plan, limit)] = articles
+        return articles if limit is None else articles[:limit]
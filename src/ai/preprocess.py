@@ -0,0 +1,87 @@
+import logging
+import os
+import re
+from bs4 import BeautifulSoup
+from ai.tokens import count_tokens, split_tokens
+
+# Largest cleaned article, in tokens, that is summarized with a single request
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "3000"))
+
+# Longer articles are split into chunks of SUMMARY_TOKEN_BUDGET tokens; text past
+# this many chunks is dropped
+MAX_SUMMARY_CHUNKS = int(os.getenv("MAX_SUMMARY_CHUNKS", "8"))
+
+# Elements that never carry article text
+_NON_TEXT_TAGS = ['script', 'style', 'noscript', 'iframe', 'img', 'svg', 'video', 'audio', 'picture', 'source', 'form']
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def extract_text(content):
+    if not content:
+        return ''
+    if '<' not in content:
+        return _WHITESPACE_RE.sub(' ', content).strip()
+    soup = BeautifulSoup(content, 'html.parser')
+    for tag in soup(_NON_TEXT_TAGS):
+        tag.decompose()
+    return _WHITESPACE_RE.sub(' ', soup.get_text(' ')).strip()
+
+def clean_content(article):
+    """Return an article's content as plain text, parsing the HTML only once.
+
+    The text is kept on the article as 'clean_content' for the next caller;
+    code that replaces an article's content drops it.
+    """
+    text = article.get('clean_content')
+    if text is None:
+        text = article['clean_content'] = extract_text(article.get('content'))
+    return text
+
+def prepare_content(content, token_budget=None, max_chunks=None, text=None):
+    """Clean an article body for summarization.
+
+    Returns (chunks, raw_tokens, sent_tokens): the cleaned text split into
+    pieces of at most token_budget tokens (a single piece for most articles),
+    and the token counts before and after cleaning and trimming. text is the
+    already cleaned content, if the caller has it.
+    """
+    token_budget = token_budget or SUMMARY_TOKEN_BUDGET
+    max_chunks = max_chunks or MAX_SUMMARY_CHUNKS
+    raw_tokens = count_tokens(content)
+    if text is None:
+        text = extract_text(content)
+    text_tokens = count_tokens(text)
+    if text_tokens <= token_budget:
+        chunks = [text]
+        sent_tokens = text_tokens
+    else:
+        chunks = split_tokens(text, token_budget)[:max_chunks]
+        sent_tokens = sum(count_tokens(chunk) for chunk in chunks)
+    return chunks, raw_tokens, sent_tokens
+
+class TokenSavings:
+    """Accumulates raw versus sent token counts for the articles of one feed."""
+
+    def __init__(self):
+        self.articles = 0
+        self.raw_tokens = 0
+        self.sent_tokens = 0
+        self.chunked = 0
+
+    def add(self, raw_tokens, sent_tokens, chunks):
+        self.articles += 1
+        self.raw_tokens += raw_tokens
+        self.sent_tokens += sent_tokens
+        if chunks > 1:
+            self.chunked += 1
+
+    def log(self):
+        if not self.articles:
+            return
+        saved = self.raw_tokens - self.sent_tokens
+        percent = 100.0 * saved / self.raw_tokens if self.raw_tokens else 0.0
+        logging.info(
+            f"Pre-processing: {self.articles} articles, {self.raw_tokens} raw tokens, "
+            f"{self.sent_tokens} sent for summarization ({saved} saved, {percent:.1f}%), "
+            f"{self.chunked} summarized in chunks"
+        )
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import re
+from collections import Counter
+import numpy as np
+
+# Normalized BM25 scores at or above ACCEPT_THRESHOLD are kept without asking the
+# LLM; everything below is sent to the LLM. Terms are matched exactly, without
+# stemming, so an article about an "election" scores 0 for "elections" and
+# auto-rejecting low scores would silently drop it. Rejection is therefore off
+# by default (-1); set REJECT_THRESHOLD to 0 or more to drop scores at or below it.
+ACCEPT_THRESHOLD = float(os.getenv("PRESCREEN_ACCEPT_THRESHOLD", "0.6"))
+REJECT_THRESHOLD = float(os.getenv("PRESCREEN_REJECT_THRESHOLD", "-1"))
+
+# Title terms are counted this many times so a keyword in the title weighs more
+TITLE_WEIGHT = 2
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Running totals across calls, useful when tuning the thresholds on a feed
+stats = {'accepted': 0, 'rejected': 0, 'ambiguous': 0}
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+class BM25Index:
+    """Term postings for a set of articles, scored with vectorized BM25.
+
+    Each term maps to a NumPy array of document indices and a matching array
+    of term frequencies, so scoring a keyword only touches the documents that
+    contain one of its terms.
+    """
+
+    def __init__(self, articles, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        doc_ids = {}
+        freqs = {}
+        lengths = []
+        for idx, article in enumerate(articles):
+            counts = Counter(tokenize(article.get('content')))
+            for term in tokenize(article.get('title')):
+                counts[term] += TITLE_WEIGHT
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                doc_ids.setdefault(term, []).append(idx)
+                freqs.setdefault(term, []).append(count)
+        self.size = len(lengths)
+        self.lengths = np.array(lengths, dtype=np.float64)
+        self.avg_length = self.lengths.mean() if self.size else 0.0
+        self.postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(freqs[term], dtype=np.float64))
+            for term, ids in doc_ids.items()
+        }
+
+    def idf(self, term):
+        df = len(self.postings[term][0]) if term in self.postings else 0
+        return np.log(1.0 + (self.size - df + 0.5) / (df + 0.5))
+
+    def score(self, query):
+        """Return BM25 scores for every article, normalized to [0, 1).
+
+        The normalization divides by the score a document would approach if it
+        contained every query term infinitely often.
+        """
+        scores = np.zeros(self.size, dtype=np.float64)
+        terms = set(tokenize(query))
+        if not terms or not self.size:
+            return scores
+        ceiling = 0.0
+        length_norm = self.k1 * (1.0 - self.b + self.b * self.lengths / (self.avg_length or 1.0))
+        for term in terms:
+            idf = self.idf(term)
+            ceiling += idf * (self.k1 + 1.0)
+            if term not in self.postings:
+                continue
+            ids, tf = self.postings[term]
+            scores[ids] += idf * tf * (self.k1 + 1.0) / (tf + length_norm[ids])
+        return scores / ceiling
+
+_index_cache = {}
+
+def _articles_key(articles):
+    digest = hashlib.sha256()
+    for article in articles:
+        digest.update((article.get('title') or '').encode('utf-8'))
+        digest.update(b'\0')
+        digest.update((article.get('content') or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def get_index(articles):
+    # Repeated filters over the same article set reuse the postings
+    key = _articles_key(articles)
+    index = _index_cache.get(key)
+    if index is None:
+        _index_cache.clear()
+        index = _index_cache[key] = BM25Index(articles)
+    return index
+
+def prescreen(articles, keyword, accept_threshold=None, reject_threshold=None):
+    """Decide locally which articles clearly match or clearly miss keyword.
+
+    Returns a list aligned with articles holding True (accept), False
+    (reject) or None (ambiguous, ask the LLM).
+    """
+    accept_threshold = ACCEPT_THRESHOLD if accept_threshold is None else accept_threshold
+    reject_threshold = REJECT_THRESHOLD if reject_threshold is None else reject_threshold
+    if not articles or not tokenize(keyword):
+        return [None] * len(articles)
+
+    scores = get_index(articles).score(keyword)
+    accepted = scores >= accept_threshold
+    rejected = (scores <= reject_threshold) & ~accepted
+    decisions = [None] * len(articles)
+    for idx in np.flatnonzero(accepted):
+        decisions[idx] = True
+    for idx in np.flatnonzero(rejected):
+        decisions[idx] = False
+
+    accepted_count = int(accepted.sum())
+    rejected_count = int(rejected.sum())
+    ambiguous_count = len(articles) - accepted_count - rejected_count
+    stats['accepted'] += accepted_count
+    stats['rejected'] += rejected_count
+    stats['ambiguous'] += ambiguous_count
+    logging.info(
+        f"Relevance pre-screen for '{keyword}': {accepted_count} accepted, {rejected_count} rejected, "
+        f"{ambiguous_count} sent to the LLM ({accepted_count + rejected_count} LLM calls avoided)"
+    )
+    return decisions
@@ -0,0 +1,248 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import time
+import openai
+
+# Starting limits; the x-ratelimit-* headers of each response replace them with
+# the account's actual quota. 0 disables a limit until a header reports one.
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Consecutive server or connection failures that open the circuit, and how long
+# it stays open before requests are tried again
+CIRCUIT_FAILURES = int(os.getenv("OPENAI_CIRCUIT_FAILURES", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("OPENAI_CIRCUIT_COOLDOWN", "30"))
+
+# How often requests held back during a half-open probe check for its outcome
+PROBE_POLL_INTERVAL = 0.1
+
+# Completion tokens assumed for a request until its usage is known
+COMPLETION_TOKEN_ESTIMATE = 200
+
+# Lower values are served first; stages not listed get DEFAULT_PRIORITY
+PRIORITIES = {'summarize': 0}
+DEFAULT_PRIORITY = 1
+
+_RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+def parse_duration(value):
+    """Parse reset durations such as '1s', '6m0s' or '250ms' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    milliseconds = headers.get('retry-after-ms')
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get('retry-after'))
+
+class TokenBucket:
+    """Refills at per_minute / 60 units per second up to per_minute units."""
+
+    def __init__(self, per_minute):
+        self.updated = time.monotonic()
+        self.set_limit(per_minute)
+        self.level = self.capacity
+
+    def set_limit(self, per_minute):
+        self.capacity = float(per_minute or 0)
+        self.rate = self.capacity / 60.0
+
+    def _refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole bucket goes through once the bucket is full
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def sync(self, limit, remaining, now):
+        # The server's own count is authoritative: never assume more is left than it reports
+        if limit:
+            self.set_limit(limit)
+        self._refill(now)
+        if remaining is not None and self.capacity:
+            self.level = min(self.level, remaining)
+
+class RequestScheduler:
+    """Admission control shared by every chat completion in the process.
+
+    Requests wait for both a requests-per-minute and a tokens-per-minute
+    bucket, in priority order (summaries before bulk transforms). The buckets
+    follow the x-ratelimit-* headers of each response. Retryable failures are
+    retried with exponential backoff and full jitter; a 429 pauses all
+    requests for its Retry-After, except an exhausted quota
+    (insufficient_quota), which is never retried. After CIRCUIT_FAILURES
+    consecutive server or connection errors, or an exhausted quota, the
+    circuit opens and requests fail immediately for CIRCUIT_COOLDOWN seconds.
+    Then a single probe request is let through while the others wait: if it
+    succeeds the circuit closes, if it fails the circuit opens again.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES, circuit_failures=CIRCUIT_FAILURES, circuit_cooldown=CIRCUIT_COOLDOWN):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.circuit_failures = circuit_failures
+        self.circuit_cooldown = circuit_cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        # While the circuit is half-open, the probe counts as in flight until this time
+        self.probe_until = 0.0
+        self.paused_until = 0.0
+        self._sequence = itertools.count()
+        # Waiting primitives belong to one event loop and are recreated for the next
+        self._loop = None
+        self._condition = None
+        self._waiters = []
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+            self._waiters = []
+
+    def _check_circuit(self, now):
+        if self.consecutive_failures >= self.circuit_failures and now < self.open_until:
+            raise CircuitOpenError(f"OpenAI circuit open for another {self.open_until - now:.1f}s after {self.consecutive_failures} consecutive failures")
+
+    def _wait_time(self, tokens, now):
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now)
+        )
+
+    async def acquire(self, tokens, stage='chat'):
+        """Wait until a request of about this many tokens may be sent."""
+        self._bind_loop()
+        self._check_circuit(time.monotonic())
+        entry = (PRIORITIES.get(stage, DEFAULT_PRIORITY), next(self._sequence))
+        condition = self._condition
+        async with condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._check_circuit(now)
+                    half_open = self.consecutive_failures >= self.circuit_failures
+                    if half_open and now < self.probe_until:
+                        # Another request is probing the API; wait for its outcome
+                        wait = PROBE_POLL_INTERVAL
+                    elif self._waiters[0] == entry:
+                        wait = self._wait_time(tokens, now)
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            if half_open:
+                                # Only one probe; a probe whose outcome is never reported expires
+                                self.probe_until = now + self.circuit_cooldown
+                                logging.info("OpenAI circuit half-open, sending one probe request")
+                            return
+                    else:
+                        wait = None
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                condition.notify_all()
+
+    def record_response(self, headers, estimated_tokens, used_tokens):
+        now = time.monotonic()
+        self.consecutive_failures = 0
+        self.probe_until = 0.0
+        if used_tokens is not None:
+            # Settle the estimate charged in acquire() against the actual usage
+            self.tokens.take(used_tokens - estimated_tokens, now)
+        self._sync_headers(headers, now)
+
+    def _sync_headers(self, headers, now):
+        headers = headers or {}
+        self.requests.sync(_int_header(headers, 'x-ratelimit-limit-requests'), _int_header(headers, 'x-ratelimit-remaining-requests'), now)
+        self.tokens.sync(_int_header(headers, 'x-ratelimit-limit-tokens'), _int_header(headers, 'x-ratelimit-remaining-tokens'), now)
+
+    def retry_delay(self, error, attempt):
+        """Return seconds to wait before retrying after error, or None to give up."""
+        # Any outcome settles a half-open probe; a failed one reopens the circuit below
+        self.probe_until = 0.0
+        if isinstance(error, openai.RateLimitError) and getattr(error, 'code', None) == 'insufficient_quota':
+            # Waiting does not bring quota back, so stop sending requests for a while
+            logging.error("OpenAI quota exhausted (insufficient_quota), not retrying")
+            self._open_circuit()
+            return None
+        if not isinstance(error, _RETRYABLE) or attempt >= self.max_retries:
+            if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+                self._record_failure()
+            return None
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        now = time.monotonic()
+        if isinstance(error, openai.RateLimitError):
+            retry_after = _retry_after(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            # Everyone waits out the quota window, not only this request
+            self.paused_until = max(self.paused_until, now + delay)
+            self.requests.sync(None, 0, now)
+            self._sync_headers(getattr(getattr(error, 'response', None), 'headers', None), now)
+        else:
+            self._record_failure()
+        return delay
+
+    def _record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.circuit_failures:
+            self._open_circuit()
+
+    def _open_circuit(self):
+        self.consecutive_failures = max(self.consecutive_failures, self.circuit_failures)
+        self.open_until = time.monotonic() + self.circuit_cooldown
+        logging.error(f"OpenAI circuit opened for {self.circuit_cooldown:.0f}s after {self.consecutive_failures} consecutive failures")
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
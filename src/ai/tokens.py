@@ -0,0 +1,48 @@
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough average for English text with the GPT-4o tokenizer, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding().encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def split_tokens(text, max_tokens):
+    """Split text into consecutive pieces of at most max_tokens tokens each."""
+    if not text:
+        return []
+    if tiktoken is not None:
+        encoding = _get_encoding()
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    # Without tiktoken, cut on whitespace near the estimated character limit
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = start + max_chars
+        if end < len(text):
+            space = text.rfind(' ', start, end)
+            if space > start:
+                end = space
+        pieces.append(text[start:end].strip())
+        start = end
+    return [piece for piece in pieces if piece]
+
+def truncate_tokens(text, max_tokens):
+    pieces = split_tokens(text, max_tokens)
+    return pieces[0] if pieces else ''
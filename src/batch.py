@@ -0,0 +1,262 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+# The article store is looked up through the module so the runner always sees
+# the same store as summarize_article_async
+from ai import openai_utils
+from ai.dedup import DEDUP_THRESHOLD, NearDuplicateIndex
+from ai.openai_utils import (
+    SUMMARY_UNAVAILABLE, async_client_scope, duplicate_article, filter_feed_async, rewrite_article_async,
+    summarize_article_async
+)
+from ai.plan import order_steps
+from ai.preprocess import TokenSavings
+from utils.feed_fetcher import FeedFetcher
+from utils.logging_config import setup_logging
+from utils.metrics import metrics
+
+STEP_KINDS = ('filter', 'translate', 'slang')
+
+def parse_chain(chain):
+    """Turn [{"filter": "AI"}, {"translate": "French"}, ...] into [('filter', 'AI'), ('translate', 'French'), ...]."""
+    steps = []
+    for entry in chain or []:
+        if not isinstance(entry, dict) or len(entry) != 1:
+            raise ValueError(f"Invalid transform step: {entry!r}")
+        (kind, argument), = entry.items()
+        if kind not in STEP_KINDS or not isinstance(argument, str) or not argument.strip():
+            raise ValueError(f"Invalid transform step: {entry!r}")
+        steps.append((kind, argument.strip()))
+    return steps
+
+class JsonlWriter:
+    """Appends one JSON object per line and flushes after each, so results show up as they complete."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = sys.stdout if path == '-' else open(path, 'a', encoding='utf-8')
+        self.written = 0
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.written += 1
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+class BatchRunner:
+    """Processes every feed once per cycle and writes each finished article.
+
+    Near-duplicates are detected across all feeds of a cycle: the first copy
+    of a story is summarized and later copies, in the same or another feed,
+    reuse its summary.
+    """
+
+    def __init__(self, feeds, steps, writer, fetcher, workers=4, new_only=False, dedup_threshold=None):
+        self.feeds = feeds
+        self.filters, self.rewrites = order_steps(steps)
+        self.writer = writer
+        self.fetcher = fetcher
+        self.new_only = new_only
+        self.dedup_threshold = DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+        self.stop = asyncio.Event()
+        self._feed_slots = asyncio.Semaphore(workers)
+        self._rewrite_name = 'rewrite:' + json.dumps(self.rewrites) if self.rewrites else None
+        self._new_dedup_index()
+
+    def _new_dedup_index(self):
+        # One index per cycle; _summaries maps each representative to its summarizing task
+        self._dedup = NearDuplicateIndex(self.dedup_threshold) if self.dedup_threshold > 0 else None
+        self._summaries = {}
+
+    async def _rewrite(self, source_article, article):
+        store = openai_utils.get_article_store()
+        if store is not None:
+            stored = store.get_derived(source_article, self._rewrite_name)
+            if stored is not None:
+                return stored
+        rewritten = await rewrite_article_async(article, self.rewrites)
+        if store is not None and rewritten is not article:
+            store.set_derived(source_article, self._rewrite_name, rewritten)
+        return rewritten
+
+    def _is_done(self, store, article):
+        # An article counts as done once its summary and, with rewrites, its rewrite are stored
+        if not store.contains(article):
+            return False
+        return not self.rewrites or store.get_derived(article, self._rewrite_name) is not None
+
+    def _summarize(self, item_id, source_article, savings):
+        # Synchronous, so a representative's task is registered before any other feed can match it
+        representative = self._dedup.add(item_id, source_article) if self._dedup is not None else None
+        if representative is None:
+            self._summaries[item_id] = asyncio.ensure_future(summarize_article_async(source_article, savings))
+            return self._summaries[item_id]
+        return asyncio.ensure_future(self._copy_summary(source_article, representative))
+
+    async def _copy_summary(self, source_article, representative):
+        processed_representative, _ = await self._summaries[representative]
+        article = duplicate_article(source_article, processed_representative)
+        metrics.increment('dedup_skipped_total')
+        store = openai_utils.get_article_store()
+        if store is not None and article['summary'] != SUMMARY_UNAVAILABLE:
+            store.save_summary(source_article, article['summary'])
+        return article, False
+
+    async def _process_article(self, url, source_article, summarizing):
+        """Write one article and return True, or return False if a step failed."""
+        article, summarized = await summarizing
+        if article['summary'] == SUMMARY_UNAVAILABLE:
+            metrics.increment('batch_articles_failed_total', step='summarize')
+            return False
+        if self.rewrites:
+            summarized_article = article
+            article = await self._rewrite(source_article, article)
+            # A failed rewrite hands back its input unchanged
+            if article is summarized_article:
+                metrics.increment('batch_articles_failed_total', step='rewrite')
+                return False
+        record = dict(article)
+        record['feed'] = url
+        record['summarized'] = summarized
+        record['processed_at'] = time.time()
+        self.writer.write(record)
+        return True
+
+    async def process_feed(self, url):
+        async with self._feed_slots:
+            if self.stop.is_set():
+                return
+            # The feed's validators are only kept once all of its articles are written,
+            # otherwise the next cycle would get a 304 and never retry the failed ones
+            result = await asyncio.to_thread(self.fetcher.fetch, url, remember_validators=False)
+            if result.error is not None or result.status == 304:
+                return
+            articles = result.articles
+            store = openai_utils.get_article_store()
+            if self.new_only and store is not None:
+                articles = [article for article in articles if not self._is_done(store, article)]
+            for _, keyword in self.filters:
+                if not articles:
+                    break
+                articles = await filter_feed_async(articles, keyword)
+            savings = TokenSavings()
+            summaries = [self._summarize((url, idx), article, savings) for idx, article in enumerate(articles)]
+            written = await asyncio.gather(*(
+                self._process_article(url, article, summarizing) for article, summarizing in zip(articles, summaries)
+            ))
+            savings.log()
+            failed = written.count(False)
+            if failed:
+                logging.warning(f"Feed {url}: {failed} of {len(articles)} articles failed and will be retried next cycle")
+            else:
+                self.fetcher.commit_validators(url)
+            logging.info(f"Feed {url}: {len(result.articles)} entries, {len(articles) - failed} written")
+
+    async def run_cycle(self):
+        start = time.monotonic()
+        written = self.writer.written
+        self._new_dedup_index()
+        with metrics.timer('batch_cycle_seconds'):
+            await asyncio.gather(*(self.process_feed(url) for url in self.feeds))
+        self.fetcher.save_validators()
+        store = openai_utils.get_article_store()
+        if store is not None:
+            store.compact()
+        logging.info(f"Processed {len(self.feeds)} feeds in {time.monotonic() - start:.1f}s, wrote {self.writer.written - written} articles")
+
+    async def run(self, interval=None):
+        while not self.stop.is_set():
+            cycle_start = time.monotonic()
+            await self.run_cycle()
+            if not interval:
+                break
+            remaining = interval - (time.monotonic() - cycle_start)
+            if remaining > 0:
+                try:
+                    await asyncio.wait_for(self.stop.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+def load_feeds(args, config):
+    feeds = list(config.get('feeds', []))
+    feeds.extend(args.feeds)
+    if args.feeds_file:
+        with open(args.feeds_file, 'r', encoding='utf-8') as f:
+            feeds.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith('#'))
+    # Keep the first occurrence of each URL
+    return list(dict.fromkeys(feeds))
+
+async def run(args, feeds, steps):
+    new_only = bool(args.interval) or args.new_only
+    writer = JsonlWriter(args.output)
+    # Conditional requests only make sense when unchanged articles are not written again
+    fetcher = FeedFetcher(validator_path=(args.validators or None) if new_only else None, max_workers=args.workers)
+    runner = BatchRunner(feeds, steps, writer, fetcher, workers=args.workers, new_only=new_only)
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            # In-flight feeds finish and are written; feeds not started yet are skipped
+            loop.add_signal_handler(signum, runner.stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    try:
+        async with async_client_scope(max_in_flight=args.max_in_flight):
+            await runner.run(args.interval)
+    finally:
+        fetcher.close()
+        writer.close()
+        metrics.log_summary()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Process RSS/Atom feeds without interaction and write the articles as JSON Lines.")
+    parser.add_argument('feeds', nargs='*', metavar='xml_url', help='URL of an RSS or Atom feed')
+    parser.add_argument('--feeds-file', help='File with one feed URL per line')
+    parser.add_argument('--config', help='JSON file with "feeds" (list of URLs) and "chain" (list of transform steps)')
+    parser.add_argument('--chain', help='Transform steps as JSON, e.g. \'[{"filter": "AI"}, {"translate": "French"}, {"slang": "pirate"}]\'')
+    parser.add_argument('--output', default='-', help='JSONL file to append results to (default: stdout)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of feeds processed at the same time')
+    parser.add_argument('--max-in-flight', type=int, default=16, help='Global cap on OpenAI requests in flight')
+    parser.add_argument('--interval', type=float, help='Run as a daemon, polling the feeds every this many seconds')
+    parser.add_argument('--new-only', action='store_true', help='Only write new or changed articles (always on with --interval)')
+    parser.add_argument('--validators', default=os.getenv('FEED_VALIDATORS_PATH', 'feed_validators.json'),
+                        help='File storing ETag/Last-Modified per feed for conditional requests with --new-only/--interval (empty to disable)')
+    parser.add_argument('--metrics-json', help='Write timings and token counts to this JSON file at exit')
+    parser.add_argument('--metrics-prom', help='Write timings and token counts to this Prometheus text file at exit')
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    try:
+        steps = parse_chain(json.loads(args.chain) if args.chain else config.get('chain'))
+    except ValueError as e:
+        parser.error(str(e))
+    feeds = load_feeds(args, config)
+    if not feeds:
+        parser.error("No feeds given")
+
+    asyncio.run(run(args, feeds, steps))
+
+if __name__ == '__main__':
+    main()
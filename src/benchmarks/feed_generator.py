@@ -0,0 +1,83 @@
+import argparse
+import random
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "market government research company data launch report city energy policy "
+    "climate model security study team vote court league season startup chip "
+    "network health vaccine budget growth island coast storm earnings deal "
+    "software release update users privacy school science space mission rocket "
+    "the a of and to in for on with as by at from that this is was will said "
+    "new first year week people officials analysts according more than after"
+).split()
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 22))]
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + '.'
+
+def _paragraph(rng):
+    return ' '.join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+
+def article_html(rng, paragraphs):
+    """Return an HTML body shaped like a typical blog/news post."""
+    parts = [f'<div class="post"><p><em>{escape(_sentence(rng))}</em></p>']
+    for number in range(paragraphs):
+        parts.append(f'<p>{escape(_paragraph(rng))} <a href="https://example.com/ref/{rng.randint(1, 10**6)}">Read more</a></p>')
+        if number % 3 == 1:
+            parts.append(
+                f'<figure><img src="https://cdn.example.com/img/{rng.randint(1, 10**6)}.jpg" alt="photo" width="800"/>'
+                f'<figcaption>{escape(_sentence(rng))}</figcaption></figure>'
+            )
+        if number % 5 == 4:
+            parts.append('<script type="text/javascript">window.ads = window.ads || []; window.ads.push({slot: "inline"});</script>')
+    parts.append('<style>.post p { margin: 0 0 1em; }</style></div>')
+    return ''.join(parts)
+
+def _paragraph_count(rng):
+    # Mostly short posts with a long tail of very long ones
+    roll = rng.random()
+    if roll < 0.7:
+        return rng.randint(2, 6)
+    if roll < 0.95:
+        return rng.randint(7, 20)
+    return rng.randint(40, 120)
+
+def iter_feed(entries, feed_format='atom', seed=0):
+    """Yield a feed document with the given number of entries piece by piece."""
+    rng = random.Random(seed)
+    if feed_format == 'atom':
+        yield '<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom"><title>Synthetic feed</title>'
+    else:
+        yield '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>Synthetic feed</title>'
+    for idx in range(entries):
+        title = escape(' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))).capitalize())
+        body = escape(article_html(rng, _paragraph_count(rng)))
+        url = f"https://news.example.com/{idx}/{rng.randint(1, 10**9)}"
+        if feed_format == 'atom':
+            yield (
+                f'<entry><title>{title}</title><link rel="alternate" href="{url}"/><id>{url}</id>'
+                f'<updated>2024-10-05T12:00:00Z</updated><content type="html">{body}</content></entry>'
+            )
+        else:
+            yield (
+                f'<item><title>{title}</title><link>{url}</link><guid>{url}</guid>'
+                f'<pubDate>Sat, 05 Oct 2024 12:00:00 GMT</pubDate><description>{body}</description></item>'
+            )
+    yield '</feed>' if feed_format == 'atom' else '</channel></rss>'
+
+def generate_feed(entries, feed_format='atom', seed=0):
+    return ''.join(iter_feed(entries, feed_format, seed))
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Atom or RSS feed.")
+    parser.add_argument('entries', type=int, help='Number of entries (e.g. 10 to 100000)')
+    parser.add_argument('output', help='File to write the feed to')
+    parser.add_argument('--format', choices=['atom', 'rss'], default='atom')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.writelines(iter_feed(args.entries, args.format, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI chat completions endpoint.
+
+    Every request waits latency seconds plus up to jitter seconds before
+    answering. A fraction rate_429 of requests is rejected with a 429 and a
+    Retry-After header instead. With rpm set, requests beyond a quota of rpm per
+    minute, refilled continuously, are rejected too, and every response carries
+    x-ratelimit-* headers describing the quota. Replies are shaped after the prompts used
+    in ai.openai_utils so the callers' parsing is exercised as well.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.05, jitter=0.02, rate_429=0.0, retry_after=0.1, seed=None, rpm=None):
+        super().__init__(address, MockOpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.rpm = rpm
+        self._allowance = float(rpm or 0)
+        self._updated = time.monotonic()
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def next_delay(self):
+        """Return (reject, delay, headers) for the next request."""
+        with self._lock:
+            self.requests += 1
+            reject = self.random.random() < self.rate_429
+            headers = {}
+            if self.rpm:
+                # The quota refills continuously at rpm / 60 requests per second
+                now = time.monotonic()
+                self._allowance = min(self.rpm, self._allowance + (now - self._updated) * self.rpm / 60.0)
+                self._updated = now
+                if self._allowance < 1:
+                    reject = True
+                    headers['Retry-After'] = f"{(1 - self._allowance) * 60.0 / self.rpm:.3f}"
+                else:
+                    self._allowance -= 1
+                headers.update({
+                    'x-ratelimit-limit-requests': str(self.rpm),
+                    'x-ratelimit-remaining-requests': str(int(self._allowance)),
+                    'x-ratelimit-reset-requests': f"{(self.rpm - self._allowance) * 60.0 / self.rpm:.3f}s"
+                })
+            if reject:
+                self.rejected += 1
+            return reject, self.latency + self.random.uniform(0, self.jitter), headers
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+def _reply_for(request):
+    messages = request.get('messages', [])
+    system = next((m['content'] for m in messages if m['role'] == 'system'), '')
+    user = next((m['content'] for m in messages if m['role'] == 'user'), '')
+
+    if request.get('response_format', {}).get('type') == 'json_object':
+        articles = json.loads(user).get('articles', [])
+        results = []
+        for item in articles:
+            result = dict(item)
+            result['relevant'] = True
+            result.setdefault('summary', '')
+            results.append(result)
+        return json.dumps({'results': results})
+    if 'relevant' in system:
+        return 'Yes'
+    if 'Title:' in user:
+        # translate, slang and fused rewrites answer in the labeled format they were sent
+        return user
+    return "This is a synthetic summary of the article. It covers the main points in two sentences."
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+
+        reject, delay, headers = self.server.next_delay()
+        time.sleep(delay)
+        if reject:
+            rejection_headers = {'Retry-After': str(self.server.retry_after), 'x-ratelimit-remaining-requests': '0'}
+            rejection_headers.update(headers)
+            self._send_json(
+                429,
+                {'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error', 'code': 'rate_limit_exceeded'}},
+                rejection_headers
+            )
+            return
+
+        content = _reply_for(request)
+        prompt_tokens = sum(_estimate_tokens(m.get('content', '')) for m in request.get('messages', []))
+        completion_tokens = _estimate_tokens(content)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+        if request.get('stream'):
+            self._send_stream(request, content, usage, headers)
+            return
+        self._send_json(200, {
+            'id': f"chatcmpl-mock-{self.server.requests}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        }, headers)
+
+    def _send_stream(self, request, content, usage, headers=None):
+        # Server-sent events, one chunk per word, then a usage chunk and [DONE]
+        base = {
+            'id': f"chatcmpl-mock-{self.server.requests}",
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock')
+        }
+        words = content.split(' ')
+        events = [
+            dict(base, choices=[{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}, 'finish_reason': None}])
+            for i, word in enumerate(words)
+        ]
+        events.append(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        if request.get('stream_options', {}).get('include_usage'):
+            events.append(dict(base, choices=[], usage=usage))
+        body = ''.join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.05, help='Base response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Maximum extra random latency in seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Retry-After seconds sent with 429 responses')
+    parser.add_argument('--rpm', type=int, help='Requests per minute allowed before answering 429')
+    args = parser.parse_args()
+    server = MockOpenAIServer((args.host, args.port), args.latency, args.jitter, args.rate_429, args.retry_after, rpm=args.rpm)
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
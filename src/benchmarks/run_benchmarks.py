@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.feed_generator import generate_feed
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+BENCHMARKS = ['parse_user_xml', 'iter_user_xml', 'process_user_feed', 'prescreen', 'filter_feed', 'translate_feed', 'apply_slang']
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _time_requests(openai_utils, latencies):
+    # Wrap the single chat-completion entry point to record per-request latency
+    chat_completion = openai_utils._chat_completion
+
+    async def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await chat_completion(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    openai_utils._chat_completion = timed
+
+def run_single(name, entries, feed_format, repeat, concurrency):
+    """Run one benchmark in this process and return its result dict."""
+    import io
+    from ai import openai_utils, prescreen
+    from parsers.xml_parser import iter_user_xml, parse_user_xml
+
+    xml = generate_feed(entries, feed_format)
+    request_latencies = []
+    _time_requests(openai_utils, request_latencies)
+
+    if name == 'parse_user_xml':
+        operation = lambda: parse_user_xml(xml)
+    elif name == 'iter_user_xml':
+        data = xml.encode('utf-8')
+        operation = lambda: sum(1 for _ in iter_user_xml(io.BytesIO(data)))
+    elif name == 'process_user_feed':
+        operation = lambda: openai_utils.process_user_feed(xml, concurrency=concurrency)
+    else:
+        articles = [dict(article, summary='A short summary of the article.') for article in parse_user_xml(xml)]
+        if name == 'prescreen':
+            # Local BM25 scoring alone, including building the index as a first filter does
+            def operation():
+                prescreen._index_cache.clear()
+                return prescreen.prescreen(articles, 'security')
+        elif name == 'filter_feed':
+            # 'security' is in most generated articles and would be accepted locally,
+            # so the LLM relevance checks are measured without the prescreen
+            operation = lambda: openai_utils.filter_feed(articles, 'security', concurrency=concurrency, use_prescreen=False)
+        elif name == 'translate_feed':
+            operation = lambda: openai_utils.translate_feed(articles, 'French', concurrency=concurrency)
+        elif name == 'apply_slang':
+            operation = lambda: openai_utils.apply_slang(articles, 'cyberpunk', concurrency=concurrency)
+        else:
+            raise ValueError(f"Unknown benchmark: {name}")
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        runs.append(time.perf_counter() - start)
+
+    median_run = percentile(runs, 0.5)
+    return {
+        'benchmark': name,
+        'entries': entries,
+        'format': feed_format,
+        'repeat': repeat,
+        'concurrency': concurrency,
+        'runs_s': [round(run, 6) for run in runs],
+        'run_p50_s': round(median_run, 6),
+        'run_p95_s': round(percentile(runs, 0.95), 6),
+        'throughput_entries_per_s': round(entries / median_run, 2) if median_run else None,
+        'requests': len(request_latencies),
+        'request_p50_ms': round(percentile(request_latencies, 0.5) * 1000, 3) if request_latencies else None,
+        'request_p95_ms': round(percentile(request_latencies, 0.95) * 1000, 3) if request_latencies else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None
+    }
+
+def run_in_subprocess(name, entries, args, base_url):
+    # A fresh interpreter per benchmark keeps peak RSS numbers independent
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_BASE_URL': base_url,
+        'OPENAI_API_KEY': 'mock-key',
+        'OPENAI_CACHE_PATH': '',
+        'ARTICLE_STORE_PATH': ''
+    })
+    command = [
+        sys.executable, '-m', 'benchmarks.run_benchmarks', '--single', name,
+        '--entries', str(entries), '--format', args.format,
+        '--repeat', str(args.repeat), '--concurrency', str(args.concurrency)
+    ]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if completed.returncode != 0:
+        return {'benchmark': name, 'entries': entries, 'error': completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feed parsing and processing against a local mock OpenAI server.")
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--entries', nargs='+', type=int, default=[10, 100, 1000], help='Feed sizes to benchmark')
+    parser.add_argument('--format', choices=['atom', 'rss'], default='atom')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05, help='Mock server base latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Mock server maximum extra latency in seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of mock requests answered with 429')
+    parser.add_argument('--rpm', type=int, help='Mock server quota in requests per minute, with x-ratelimit-* headers')
+    parser.add_argument('--output', help='Write the JSON results to this file as well as stdout')
+    parser.add_argument('--single', choices=BENCHMARKS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single, args.entries[0], args.format, args.repeat, args.concurrency)))
+        return
+
+    server = MockOpenAIServer(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429, rpm=args.rpm)
+    server.start()
+    results = []
+    try:
+        for entries in args.entries:
+            for name in args.benchmarks:
+                result = run_in_subprocess(name, entries, args, server.base_url)
+                print(f"{name} ({entries} entries): {result.get('run_p50_s', result.get('error'))}", file=sys.stderr)
+                results.append(result)
+    finally:
+        server.shutdown()
+
+    report = {
+        'mock_server': {
+            'latency_s': args.latency,
+            'jitter_s': args.jitter,
+            'rate_429': args.rate_429,
+            'rpm': args.rpm,
+            'requests': server.requests,
+            'rejected': server.rejected
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Stored summaries reused before their last_seen updates are written in one transaction
+SEEN_FLUSH_INTERVAL = 100
+
+def article_key(article):
+    # Feeds identify entries by link or guid; fall back to the title for entries with neither
+    if article.get('url'):
+        return article['url']
+    return 'title:' + hashlib.sha256((article.get('title') or '').encode('utf-8')).hexdigest()
+
+def content_hash(article):
+    digest = hashlib.sha256()
+    digest.update((article.get('title') or '').encode('utf-8'))
+    digest.update(b'\0')
+    digest.update((article.get('content') or '').encode('utf-8'))
+    return digest.hexdigest()
+
+class ArticleStore:
+    """Persistent record of processed articles, stored in SQLite.
+
+    Each entry is keyed by its URL (or guid) together with a hash of its title
+    and content, so an article is only processed again when it is new or has
+    been edited. Besides the summary, each entry keeps a dict of derived
+    outputs (translations, slang rewrites, ...). Entries not seen for
+    retention_days, and the oldest ones past max_entries, are removed by
+    compact(). Reusing a stored summary only reads the database; its new
+    last_seen is written with the next SEEN_FLUSH_INTERVAL reuses, by
+    compact(), or on close().
+    """
+
+    def __init__(self, path, retention_days=30, max_entries=50000):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_entries = max_entries
+        self.processed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._pending_seen = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " key TEXT PRIMARY KEY,"
+            " content_hash TEXT NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " derived TEXT NOT NULL DEFAULT '{}',"
+            " last_seen REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS articles_last_seen ON articles (last_seen)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv("ARTICLE_STORE_PATH", "article_store.db")
+        if not path:
+            return None
+        retention_days = float(os.getenv("ARTICLE_STORE_RETENTION_DAYS", "30"))
+        max_entries = int(os.getenv("ARTICLE_STORE_MAX_ENTRIES", "50000"))
+        return cls(path, retention_days=retention_days, max_entries=max_entries)
+
+    def get_summary(self, article):
+        """Return the stored summary if this exact version of the article was processed before."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM articles WHERE key = ? AND content_hash = ?",
+                (article_key(article), content_hash(article))
+            ).fetchone()
+            if row is None:
+                self.processed += 1
+                return None
+            self._pending_seen[article_key(article)] = time.time()
+            if len(self._pending_seen) >= SEEN_FLUSH_INTERVAL:
+                self._flush_seen()
+                self._conn.commit()
+            self.skipped += 1
+            return row[0]
+
+    def contains(self, article):
+        """Return True if this exact version of the article is already stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM articles WHERE key = ? AND content_hash = ?",
+                (article_key(article), content_hash(article))
+            ).fetchone()
+        return row is not None
+
+    def save_summary(self, article, summary):
+        # A new content hash replaces the entry, dropping outputs derived from the old version
+        with self._lock:
+            self._pending_seen.pop(article_key(article), None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO articles (key, content_hash, summary, derived, last_seen) VALUES (?, ?, ?, '{}', ?)",
+                (article_key(article), content_hash(article), summary, time.time())
+            )
+            self._conn.commit()
+
+    def get_derived(self, article, name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT derived FROM articles WHERE key = ? AND content_hash = ?",
+                (article_key(article), content_hash(article))
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]).get(name)
+
+    def set_derived(self, article, name, value):
+        key = article_key(article)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT derived FROM articles WHERE key = ? AND content_hash = ?",
+                (key, content_hash(article))
+            ).fetchone()
+            if row is None:
+                return
+            derived = json.loads(row[0])
+            derived[name] = value
+            self._conn.execute("UPDATE articles SET derived = ? WHERE key = ?", (json.dumps(derived), key))
+            self._conn.commit()
+
+    def _flush_seen(self):
+        if self._pending_seen:
+            self._conn.executemany(
+                "UPDATE articles SET last_seen = ? WHERE key = ?",
+                [(seen, key) for key, seen in self._pending_seen.items()]
+            )
+            self._pending_seen.clear()
+
+    def compact(self):
+        removed = 0
+        with self._lock:
+            # Entries reused this run must not look stale
+            self._flush_seen()
+            if self.retention_days:
+                cutoff = time.time() - self.retention_days * 86400
+                removed += self._conn.execute("DELETE FROM articles WHERE last_seen < ?", (cutoff,)).rowcount
+            if self.max_entries:
+                overflow = self._count() - self.max_entries
+                if overflow > 0:
+                    removed += self._conn.execute(
+                        "DELETE FROM articles WHERE key IN "
+                        "(SELECT key FROM articles ORDER BY last_seen LIMIT ?)",
+                        (overflow,)
+                    ).rowcount
+            self._conn.commit()
+        if removed:
+            logging.info(f"Article store compaction removed {removed} entries")
+        return removed
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            entries = self._count()
+        return {'processed': self.processed, 'skipped': self.skipped, 'entries': entries}
+
+    def reset_counters(self):
+        self.processed = 0
+        self.skipped = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_seen()
+            self._conn.commit()
+            self._conn.close()
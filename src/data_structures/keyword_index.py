@@ -1,37 +1,288 @@
+import bisect
+import difflib
+import json
+import logging
+import itertools
+import os
+import sys
+import time
+import zipfile
+from array import array
+import numpy as np
+from data_structures.article_store import article_key
+
+# Keywords and articles shown per page in interactive_selection
+PAGE_SIZE = 20
+
+# Article fields kept in the index for display
+ARTICLE_FIELDS = ('title', 'summary', 'url')
+
 class KeywordIndex:
-    def __init__(self, keyword_index):
-        self.keyword_index = keyword_index
+    """Inverted index from keywords to articles.
+
+    Keywords are interned and given integer ids, articles get integer ids in
+    insertion order, and each keyword maps to a sorted array of article ids.
+    Articles are replaced or removed by their URL (or guid). The alphabetical
+    keyword list used for prefix lookup and paging is rebuilt only after
+    keywords are added or dropped. save() writes the index to one .npz file
+    that load() reads back without re-extracting anything. Articles indexed
+    more than retention_days ago, and the oldest ones past max_entries, are
+    removed by compact().
+    """
+
+    def __init__(self, keyword_index=None, path=None, retention_days=30, max_entries=50000):
+        # keyword_index optionally seeds the index from a {keyword: [article, ...]} mapping
+        self.path = path
+        self.retention_days = retention_days
+        self.max_entries = max_entries
+        self._term_ids = {}
+        self._terms = []
+        self._postings = []
+        self._articles = {}
+        self._article_terms = {}
+        self._added = {}
+        self._ids_by_key = {}
+        self._next_id = 0
+        self._sorted_terms = None
+        self._terms_by_length = None
+        self.dirty = False
+        if keyword_index:
+            keywords_by_key = {}
+            for keyword, articles in keyword_index.items():
+                for article in articles:
+                    keywords_by_key.setdefault(article_key(article), (article, []))[1].append(keyword)
+            for article, keywords in keywords_by_key.values():
+                self.add(article, keywords)
+
+    @classmethod
+    def from_env(cls):
+        # An empty KEYWORD_INDEX_PATH keeps the index in memory only
+        path = os.getenv("KEYWORD_INDEX_PATH", "keyword_index.npz")
+        retention_days = float(os.getenv("KEYWORD_INDEX_RETENTION_DAYS", "30"))
+        max_entries = int(os.getenv("KEYWORD_INDEX_MAX_ENTRIES", "50000"))
+        if path and os.path.exists(path):
+            try:
+                return cls.load(path, retention_days=retention_days, max_entries=max_entries)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                # A truncated or corrupt file is rebuilt from the next processed articles
+                logging.error(f"Could not read keyword index from {path}, starting a new one: {e}")
+        return cls(path=path or None, retention_days=retention_days, max_entries=max_entries)
+
+    def __len__(self):
+        return len(self._articles)
+
+    def _term_id(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            term = sys.intern(term)
+            self._term_ids[term] = term_id
+            self._terms.append(term)
+            self._postings.append(array('I'))
+            self._sorted_terms = None
+            self._terms_by_length = None
+        return term_id
+
+    def contains(self, article):
+        """Return True if this article is indexed with the same title and summary."""
+        article_id = self._ids_by_key.get(article_key(article))
+        if article_id is None:
+            return False
+        stored = self._articles[article_id]
+        return stored['title'] == article.get('title') and stored['summary'] == article.get('summary')
+
+    def add(self, article, keywords):
+        """Index article under keywords, replacing an earlier version of it. Returns its id."""
+        self.remove(article)
+        article_id = self._next_id
+        self._next_id += 1
+        term_ids = sorted({self._term_id(keyword.strip().lower()) for keyword in keywords if keyword.strip()})
+        # Ids only grow, so appending keeps every posting array sorted
+        for term_id in term_ids:
+            self._postings[term_id].append(article_id)
+        self._articles[article_id] = {field: article.get(field) for field in ARTICLE_FIELDS}
+        self._article_terms[article_id] = array('I', term_ids)
+        self._added[article_id] = time.time()
+        self._ids_by_key[article_key(article)] = article_id
+        self.dirty = True
+        return article_id
+
+    def remove(self, article):
+        article_id = self._ids_by_key.pop(article_key(article), None)
+        if article_id is None:
+            return False
+        del self._articles[article_id]
+        del self._added[article_id]
+        for term_id in self._article_terms.pop(article_id):
+            posting = self._postings[term_id]
+            del posting[bisect.bisect_left(posting, article_id)]
+            if not posting:
+                # Keep the id slot so other ids stay valid; save() compacts it away
+                del self._term_ids[self._terms[term_id]]
+                self._terms[term_id] = None
+                self._sorted_terms = None
+                self._terms_by_length = None
+        self.dirty = True
+        return True
 
-    def interactive_selection(self):
+    def compact(self):
+        removed = 0
+        if self.retention_days:
+            cutoff = time.time() - self.retention_days * 86400
+            stale = [article_id for article_id, added in self._added.items() if added < cutoff]
+            for article_id in stale:
+                self.remove(self._articles[article_id])
+            removed += len(stale)
+        if self.max_entries:
+            overflow = len(self._articles) - self.max_entries
+            if overflow > 0:
+                # Ids grow with every add, so the first articles are the oldest
+                for article_id in list(itertools.islice(self._articles, overflow)):
+                    self.remove(self._articles[article_id])
+                removed += overflow
+        if removed:
+            logging.info(f"Keyword index compaction removed {removed} articles")
+        return removed
+
+    def count(self, keyword):
+        term_id = self._term_ids.get(keyword.lower())
+        return len(self._postings[term_id]) if term_id is not None else 0
+
+    def articles(self, keyword, offset=0, limit=None):
+        """Return articles indexed under keyword, oldest first."""
+        term_id = self._term_ids.get(keyword.lower())
+        if term_id is None:
+            return []
+        posting = self._postings[term_id]
+        end = len(posting) if limit is None else min(len(posting), offset + limit)
+        return [self._articles[article_id] for article_id in posting[offset:end]]
+
+    def _sorted(self):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._term_ids)
+        return self._sorted_terms
+
+    def keywords(self, prefix='', offset=0, limit=PAGE_SIZE):
+        """Return (total, [(keyword, article_count), ...]) for one page of keywords starting with prefix."""
+        terms = self._sorted()
+        prefix = prefix.lower()
+        start = bisect.bisect_left(terms, prefix)
+        end = bisect.bisect_left(terms, prefix + '\uffff') if prefix else len(terms)
+        page = terms[start + offset:min(end, start + offset + limit)]
+        return end - start, [(term, len(self._postings[self._term_ids[term]])) for term in page]
+
+    def fuzzy(self, keyword, limit=10, cutoff=0.75):
+        """Return up to limit (keyword, article_count) pairs spelled like keyword, closest first."""
+        if self._terms_by_length is None:
+            self._terms_by_length = {}
+            for term in self._term_ids:
+                self._terms_by_length.setdefault(len(term), []).append(term)
+        keyword = keyword.lower()
+        # A close match cannot differ much in length, so only those terms are compared
+        candidates = [
+            term
+            for length in range(max(1, len(keyword) - 2), len(keyword) + 3)
+            for term in self._terms_by_length.get(length, ())
+        ]
+        matches = difflib.get_close_matches(keyword, candidates, n=limit, cutoff=cutoff)
+        return [(term, len(self._postings[self._term_ids[term]])) for term in matches]
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        live_ids = [term_id for term_id, term in enumerate(self._terms) if term is not None]
+        remap = np.full(len(self._terms), -1, dtype=np.int64)
+        remap[live_ids] = np.arange(len(live_ids))
+        article_ids = np.fromiter(self._articles, dtype=np.uint32, count=len(self._articles))
+        article_terms = [self._article_terms[article_id] for article_id in self._articles]
+        arrays = {
+            'terms': np.frombuffer('\n'.join(self._terms[term_id] for term_id in live_ids).encode('utf-8'), dtype=np.uint8),
+            'offsets': np.cumsum([0] + [len(self._postings[term_id]) for term_id in live_ids], dtype=np.int64),
+            'postings': np.frombuffer(b''.join(self._postings[term_id].tobytes() for term_id in live_ids), dtype=np.uint32),
+            'article_ids': article_ids,
+            'article_offsets': np.cumsum([0] + [len(terms) for terms in article_terms], dtype=np.int64),
+            'article_terms': remap[np.frombuffer(b''.join(terms.tobytes() for terms in article_terms), dtype=np.uint32)].astype(np.uint32),
+            'articles': np.frombuffer(json.dumps([self._articles[article_id] for article_id in self._articles]).encode('utf-8'), dtype=np.uint8),
+            'added': np.fromiter((self._added[article_id] for article_id in self._articles), dtype=np.float64, count=len(self._articles)),
+            'next_id': np.array([self._next_id], dtype=np.int64)
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        self.path = path
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        index = cls(path=path, **kwargs)
+        with np.load(path) as data:
+            terms_blob = data['terms'].tobytes().decode('utf-8')
+            index._terms = [sys.intern(term) for term in terms_blob.split('\n')] if terms_blob else []
+            index._term_ids = {term: term_id for term_id, term in enumerate(index._terms)}
+            index._postings = _split(data['postings'], data['offsets'])
+            article_ids = data['article_ids'].tolist()
+            records = json.loads(data['articles'].tobytes().decode('utf-8'))
+            index._articles = dict(zip(article_ids, records))
+            index._article_terms = dict(zip(article_ids, _split(data['article_terms'], data['article_offsets'])))
+            index._added = dict(zip(article_ids, data['added'].tolist()))
+            index._ids_by_key = {article_key(record): article_id for article_id, record in index._articles.items()}
+            index._next_id = int(data['next_id'][0])
+        return index
+
+    def _show_articles(self, keyword, page_size):
+        total = self.count(keyword)
+        print(f"\nArticles related to '{keyword}' ({total}):")
+        if not total:
+            print("No articles found for this keyword.")
+        for article in self.articles(keyword, limit=page_size):
+            print(f"\nTitle: {article['title']}")
+            print(f"Summary: {article['summary']}")
+            print(f"URL: {article['url']}")
+        if total > page_size:
+            print(f"\n... and {total - page_size} more")
+
+    def interactive_selection(self, page_size=PAGE_SIZE):
+        # Only the current page is rendered; typing text narrows the list to
+        # keywords with that prefix, or to similarly spelled keywords
+        prefix = ''
+        matches = None
+        page = 0
         while True:
-            print("\nAvailable Keywords:")
-            sorted_keywords = sorted(self.keyword_index.keys())
-            for idx, keyword in enumerate(sorted_keywords, 1):
-                print(f"{idx}. {keyword} ({len(self.keyword_index[keyword])} articles)")
+            if matches is None:
+                total, shown = self.keywords(prefix, page * page_size, page_size)
+            else:
+                total, shown = len(matches), matches[page * page_size:(page + 1) * page_size]
+            heading = f" similar to '{prefix}'" if matches is not None else f" starting with '{prefix}'" if prefix else ''
+            print(f"\nAvailable Keywords{heading} ({total}, page {page + 1} of {max(1, -(-total // page_size))}):")
+            for idx, (keyword, count) in enumerate(shown, 1):
+                print(f"{idx}. {keyword} ({count} articles)")
             print("0. Exit")
 
-            try:
-                choice = input("\nSelect a keyword by number (or 0 to exit): ")
-                if choice.lower() == 'exit' or choice == '0':
-                    print("Exiting.")
-                    break
-                
-                choice = int(choice)
-                if 1 <= choice <= len(sorted_keywords):
-                    selected_keyword = sorted_keywords[choice - 1]
-                    relevant_articles = self.keyword_index[selected_keyword]
-                    print(f"\nArticles related to '{selected_keyword}':")
-                    if relevant_articles:
-                        for article in relevant_articles:
-                            print(f"\nTitle: {article['title']}")
-                            print(f"Summary: {article['summary']}")
-                            print(f"URL: {article['url']}")
-                    else:
-                        print("No articles found for this keyword.")
+            choice = input("\nSelect a keyword by number, type text to search, n/p for next/previous page (or 0 to exit): ").strip()
+            if choice.lower() == 'exit' or choice == '0':
+                print("Exiting.")
+                break
+            if choice.lower() == 'n':
+                if (page + 1) * page_size < total:
+                    page += 1
+            elif choice.lower() == 'p':
+                page = max(0, page - 1)
+            elif choice.isdigit():
+                number = int(choice)
+                if 1 <= number <= len(shown):
+                    self._show_articles(shown[number - 1][0], page_size)
                 else:
                     print("Choice out of range. Please try again.")
-            except ValueError:
-                print("Invalid input. Please enter a number.")
-            
-            print("\nPress Enter to continue...")
-            input()
\ No newline at end of file
+            else:
+                prefix, page = choice.lower(), 0
+                matches = None
+                if prefix and not self.keywords(prefix, limit=1)[0]:
+                    matches = self.fuzzy(prefix, limit=page_size)
+
+def _split(values, offsets):
+    # CSR arrays back to one array('I') per row
+    data = values.astype(np.uint32, copy=False).tobytes()
+    offsets = (offsets * 4).tolist()
+    return [array('I', data[start:end]) for start, end in zip(offsets, offsets[1:])]
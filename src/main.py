@@ -5,52 +5,110 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import argparse
-import requests
-from parsers.xml_parser import parse_user_xml
-from ai.openai_utils import process_user_feed, translate_feed, apply_slang, filter_feed
+from ai.openai_utils import process_user_feed, translate_feed, apply_slang, filter_feed, rewrite_feed, log_cache_stats
+from ai.keywords import build_keyword_index
+from ai.plan import TransformPlan
+from data_structures.keyword_index import KeywordIndex
+from utils.feed_fetcher import FeedFetcher
 from utils.logging_config import setup_logging
+from utils.metrics import metrics
+
+def print_article(article, heading=''):
+    print(f"\n{heading}Title: {article['title']}")
+    print(f"Summary: {article['summary']}")
+    print(f"URL: {article['url']}")
+    if article.get('duplicate_of'):
+        print(f"Duplicate of: {article['duplicate_of']}")
+    elif article.get('duplicates'):
+        print(f"Also published at: {', '.join(article['duplicates'])}")
+
+def print_articles(articles):
+    for article in articles:
+        print_article(article)
 
 def main():
     setup_logging()
     parser = argparse.ArgumentParser(description="Process and transform RSS feed XML files.")
-    parser.add_argument('xml_url', help='URL of the RSS feed XML')
+    parser.add_argument('xml_urls', nargs='+', metavar='xml_url', help='URL of an RSS or Atom feed')
+    parser.add_argument('--metrics-json', help='Write timings and token counts for the run to this JSON file')
+    parser.add_argument('--metrics-prom', help='Write timings and token counts for the run to this Prometheus text file')
     args = parser.parse_args()
 
-    print(f"Fetching XML from URL: {args.xml_url}")
-    try:
-        response = requests.get(args.xml_url)
-        response.raise_for_status()
-        xml_content = response.text
-        print(f"Successfully fetched XML. Content length: {len(xml_content)} characters")
-    except requests.RequestException as e:
-        print(f"Error fetching XML from URL: {e}")
+    # The interactive session always needs the full feed, so no conditional GET here
+    fetcher = FeedFetcher()
+    for url in args.xml_urls:
+        print(f"Fetching XML from URL: {url}")
+    results = fetcher.fetch_all(args.xml_urls)
+    fetcher.close()
+
+    articles = []
+    for result in results:
+        if result.error is not None:
+            print(f"Error fetching XML from URL {result.url}: {result.error}")
+        else:
+            print(f"Successfully fetched {result.url}: {len(result.articles)} entries")
+            articles.extend(result.articles)
+    if all(result.error is not None for result in results):
         return
 
     print("Processing user feed...")
-    processed_articles = process_user_feed(xml_content)
+    completed = []
+
+    def show_progress(index, article):
+        # Each article is printed as soon as its summary is ready
+        completed.append(index)
+        print_article(article, heading=f"[{len(completed)}/{len(articles)}] ")
+
+    processed_articles = process_user_feed(articles, on_result=show_progress)
+    # Keywords are extracted locally and added to the index kept from earlier runs
+    keyword_index = KeywordIndex.from_env()
+    build_keyword_index(processed_articles, keyword_index, sources=articles)
+    keyword_index.compact()
+
+    # Transforms are only recorded here and run when the articles are shown
+    plan = TransformPlan(
+        processed_articles,
+        filter_fn=filter_feed,
+        translate_fn=translate_feed,
+        slang_fn=apply_slang,
+        rewrite_fn=rewrite_feed
+    )
 
     while True:
-        action = input("\nWhat would you like to do? (filter/translate/slang/exit): ").lower()
+        action = input("\nWhat would you like to do? (filter/translate/slang/undo/show/keywords/exit): ").lower()
         
         if action == 'exit':
             break
         elif action == 'filter':
             keyword = input("Enter a keyword to filter the feed: ")
-            processed_articles = filter_feed(processed_articles, keyword)
+            plan.filter(keyword)
         elif action == 'translate':
             language = input("Enter the target language: ")
-            processed_articles = translate_feed(processed_articles, language)
+            plan.translate(language)
         elif action == 'slang':
             slang_style = input("Enter the slang style (e.g., cyberpunk, southern belle): ")
-            processed_articles = apply_slang(processed_articles, slang_style)
+            plan.slang(slang_style)
+        elif action == 'undo':
+            step = plan.undo()
+            print(f"Undid {step[0]} '{step[1]}'." if step else "Nothing to undo.")
+        elif action == 'show':
+            print_articles(plan.materialize())
+        elif action == 'keywords':
+            keyword_index.interactive_selection()
         else:
             print("Invalid action. Please try again.")
 
     print("\nFinal processed articles:")
-    for article in processed_articles:
-        print(f"\nTitle: {article['title']}")
-        print(f"Summary: {article['summary']}")
-        print(f"URL: {article['url']}")
+    print_articles(plan.materialize())
+
+    if keyword_index.dirty:
+        keyword_index.save()
+    log_cache_stats()
+    metrics.log_summary()
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
 
 if __name__ == '__main__':
     main()
@@ -1,35 +1,131 @@
 import xml.etree.ElementTree as ET
 import html
+import os
 import re
 import logging
+import time
+from utils.metrics import metrics
+
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+RSS1_NS = '{http://purl.org/rss/1.0/}'
+CONTENT_NS = '{http://purl.org/rss/1.0/modules/content/}'
+
+# Atom <entry>, RSS 2.0 <item> and RSS 1.0 (RDF) <item>
+ENTRY_TAGS = {ATOM_NS + 'entry', 'item', RSS1_NS + 'item'}
+
+CHUNK_SIZE = 64 * 1024
+
+# Entities XML already understands; any other '&' has to be repaired before parsing
+_XML_ENTITIES = {'amp', 'lt', 'gt', 'apos', 'quot'}
+_AMPERSAND_RE = re.compile(r'&(#\d+;|#[xX][0-9a-fA-F]+;|\w+;)?')
+
+def _text(elem):
+    return ''.join(elem.itertext()).strip()
+
+def _entry_to_article(entry):
+    title = ''
+    content = ''
+    fallback_content = ''
+    link = ''
+    has_alternate = False
+    guid = ''
+    for child in entry:
+        tag = child.tag
+        if tag in ('title', ATOM_NS + 'title', RSS1_NS + 'title'):
+            title = _text(child)
+        elif tag in (ATOM_NS + 'content', CONTENT_NS + 'encoded'):
+            content = _text(child)
+        elif tag in ('description', ATOM_NS + 'summary', RSS1_NS + 'description'):
+            fallback_content = _text(child)
+        elif tag == ATOM_NS + 'link':
+            # Prefer the alternate link, otherwise keep the first one
+            is_alternate = child.get('rel', 'alternate') == 'alternate'
+            if not link or (is_alternate and not has_alternate):
+                link = child.get('href', '')
+                has_alternate = is_alternate
+        elif tag in ('link', RSS1_NS + 'link'):
+            link = _text(child)
+        elif tag in ('guid', ATOM_NS + 'id'):
+            guid = _text(child)
+    return {
+        "title": title,
+        "content": content or fallback_content,
+        "url": link or guid
+    }
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, (str, bytes)):
+        yield source
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    elif isinstance(source, os.PathLike):
+        with open(source, 'rb') as f:
+            yield from _iter_chunks(f, chunk_size)
+    else:
+        # Any other iterable of str/bytes chunks, e.g. an HTTP response body
+        yield from source
+
+def iter_user_xml(source, chunk_size=CHUNK_SIZE):
+    """Incrementally parse an Atom or RSS feed and yield one article dict per entry.
+
+    source can be an XML string or bytes, a binary file object, a path, or
+    any iterable of byte chunks. Each entry is dropped from the tree as soon
+    as it has been converted, so memory use does not grow with the feed size.
+    Once the whole feed is parsed, parse_seconds records the time spent in
+    the parser, leaving out time spent waiting for chunks or in the consumer.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+    parsing = 0.0
+    for chunk in _iter_chunks(source, chunk_size):
+        start = time.perf_counter()
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem.tag in ENTRY_TAGS:
+                article = _entry_to_article(elem)
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+                parsing += time.perf_counter() - start
+                yield article
+                start = time.perf_counter()
+        parsing += time.perf_counter() - start
+    start = time.perf_counter()
+    parser.close()
+    metrics.observe('parse_seconds', parsing + time.perf_counter() - start)
+
+def _repair_entity(match):
+    entity = match.group(1)
+    if entity is None:
+        return '&amp;'
+    if entity.startswith('#') or entity[:-1] in _XML_ENTITIES:
+        return match.group(0)
+    # Named HTML entities such as &nbsp; are not defined in XML
+    unescaped = html.unescape(match.group(0))
+    if unescaped == match.group(0):
+        return '&amp;' + entity
+    return html.escape(unescaped, quote=False)
+
+def repair_xml(xml_string):
+    return _AMPERSAND_RE.sub(_repair_entity, xml_string)
 
 def parse_user_xml(xml_string):
+    # iter_user_xml records parse_seconds for the attempt that succeeds
     try:
-        root = ET.fromstring(xml_string)
+        return list(iter_user_xml(xml_string))
     except ET.ParseError as e:
         logging.error(f"XML parsing error: {e}")
-        logging.info("Attempting to unescape and parse again...")
-        try:
-            unescaped_xml = html.unescape(xml_string)
-            root = ET.fromstring(unescaped_xml)
-        except ET.ParseError as e:
-            logging.error(f"Failed to parse XML after unescaping: {e}")
-            logging.info("Attempting to remove problematic characters...")
-            cleaned_xml = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;)', '&amp;', unescaped_xml)
-            try:
-                root = ET.fromstring(cleaned_xml)
-            except ET.ParseError as e:
-                logging.error(f"Failed to parse XML after cleaning: {e}")
-                raise
-
-    articles = []
-    for entry in root.findall('.//{http://www.w3.org/2005/Atom}entry'):
-        title = entry.find('{http://www.w3.org/2005/Atom}title').text if entry.find('{http://www.w3.org/2005/Atom}title') is not None else ''
-        content = entry.find('{http://www.w3.org/2005/Atom}content').text if entry.find('{http://www.w3.org/2005/Atom}content') is not None else ''
-        link = entry.find('{http://www.w3.org/2005/Atom}link').get('href') if entry.find('{http://www.w3.org/2005/Atom}link') is not None else ''
-        articles.append({
-            "title": title,
-            "content": content,
-            "url": link
-        })
-    return articles
\ No newline at end of file
+        logging.info("Attempting to repair entities and parse again...")
+    try:
+        return list(iter_user_xml(repair_xml(xml_string)))
+    except ET.ParseError as e:
+        logging.error(f"Failed to parse XML after repairing entities: {e}")
+        raise
@@ -5,11 +5,18 @@ import requests
 
 from src.main import main
 
+@pytest.fixture(autouse=True)
+def keyword_index_in_tmp_path(tmp_path, monkeypatch):
+    # main() saves the keyword index it builds; keep it out of the working directory
+    monkeypatch.setenv('KEYWORD_INDEX_PATH', str(tmp_path / 'keyword_index.npz'))
+
 @pytest.fixture
 def mock_requests_get():
-    with patch('requests.get') as mock_get:
+    with patch('requests.Session.get') as mock_get:
         mock_response = MagicMock()
-        mock_response.text = '<rss><channel><item><title>Test Article</title><description>Test Description</description><link>http://example.com</link></item></channel></rss>'
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'<rss><channel><item><title>Test Article</title><description>Test Description</description><link>http://example.com</link></item></channel></rss>']
         mock_response.raise_for_status.return_value = None
         mock_get.return_value = mock_response
         yield mock_get
@@ -155,3 +162,699 @@ def test_whitespace_in_input(mock_requests_get, mock_process_user_feed, mock_fil
     assert "Enter a keyword to filter the feed: " in captured.out
     # Ensure leading/trailing whitespace is handled properly
 
+
+
+# async engine tests, run against a fake AsyncOpenAI client so no network is needed
+
+import asyncio
+import io
+import json
+import random
+from types import SimpleNamespace
+
+from ai import openai_utils
+from ai.batching import pack_batches
+from ai.cache import CompletionCache
+from ai.scheduler import RequestScheduler
+from data_structures.article_store import ArticleStore
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(random.random() / 100)
+        prompt = messages[-1]['content']
+        if 'response_format' in kwargs:
+            # Batched request: answer every article except those whose title says 'skip'
+            results = [
+                {'id': item['id'], 'relevant': True, 'title': item['title'].upper(), 'content': '', 'summary': ''}
+                for item in json.loads(prompt)['articles'] if 'skip' not in item['title']
+            ]
+            reply = json.dumps({'results': results})
+        elif 'fail' in prompt:
+            raise RuntimeError("API error")
+        else:
+            reply = f"Reply to: {prompt}"
+        if kwargs.get('stream'):
+            return fake_stream(reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+async def fake_stream(reply):
+    for start in range(0, len(reply), 8):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=reply[start:start + 8]))], usage=None)
+    yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=10, completion_tokens=len(reply) // 4))
+
+class FakeRawCompletions:
+    def __init__(self, completions):
+        self.completions = completions
+
+    async def create(self, **kwargs):
+        result = await self.completions.create(**kwargs)
+        return SimpleNamespace(headers={}, parse=lambda: result)
+
+class FakeAsyncClient:
+    def __init__(self, completions):
+        completions.with_raw_response = FakeRawCompletions(completions)
+        self.chat = SimpleNamespace(completions=completions)
+
+    async def close(self):
+        pass
+
+@pytest.fixture
+def fake_openai():
+    completions = FakeCompletions()
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+    with patch.object(openai_utils, '_new_async_client', lambda: FakeAsyncClient(completions)), \
+            patch.object(openai_utils, 'get_completion_cache', lambda: None), \
+            patch.object(openai_utils, 'get_article_store', lambda: None), \
+            patch.object(openai_utils, 'get_request_scheduler', lambda: scheduler):
+        yield completions
+
+@pytest.fixture
+def completion_cache(tmp_path):
+    cache = CompletionCache(str(tmp_path / 'cache.db'), max_entries=3)
+    with patch.object(openai_utils, 'get_completion_cache', lambda: cache):
+        yield cache
+    cache.close()
+
+def atom_feed(contents):
+    entries = ''.join(
+        f'<entry><title>Title {i}</title><content>{content}</content><link href="http://example.com/{i}"/></entry>'
+        for i, content in enumerate(contents)
+    )
+    return f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+
+def test_process_user_feed_keeps_order_and_fallback(fake_openai):
+    contents = [f'body {i}' for i in range(12)]
+    contents[5] = 'fail'
+    articles = openai_utils.process_user_feed(atom_feed(contents), concurrency=3)
+
+    assert [a['url'] for a in articles] == [f'http://example.com/{i}' for i in range(12)]
+    assert articles[5]['summary'] == "Summary not available."
+    assert articles[0]['summary'].endswith('body 0')
+    assert fake_openai.calls == 12
+
+def test_filter_feed_keeps_articles_on_error(fake_openai):
+    articles = [
+        {'title': 'ok', 'content': 'body', 'summary': 's', 'url': 'a'},
+        {'title': 'bad', 'content': 'fail', 'summary': 's', 'url': 'b'},
+    ]
+    assert openai_utils.filter_feed(articles, 'kw', use_prescreen=False) == [articles[1]]
+
+def test_warm_rerun_is_served_from_cache(fake_openai, completion_cache):
+    xml = atom_feed(['one', 'two'])
+    first = openai_utils.process_user_feed(xml)
+    second = openai_utils.process_user_feed(xml)
+
+    assert first == second
+    assert fake_openai.calls == 2
+    assert completion_cache.stats()['hits'] == 2
+
+def test_completion_cache_evicts_least_recently_used(tmp_path):
+    cache = CompletionCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    cache.get('a')
+    cache.set('c', 'C')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.stats()['evictions'] == 1
+    cache.close()
+
+def test_completion_cache_writes_hit_recency_on_close(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = CompletionCache(path, max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    cache.set('b', 'B2')
+    assert cache.get('a') == 'A'
+    assert cache.stats()['entries'] == 2
+    cache.close()
+
+    reopened = CompletionCache(path, max_entries=2)
+    assert reopened.stats()['entries'] == 2
+    reopened.set('c', 'C')
+    # The hit on 'a' made 'b' the least recently used entry
+    assert reopened.get('b') is None
+    assert reopened.get('a') == 'A'
+    reopened.close()
+
+def test_process_user_feed_accepts_stream(fake_openai):
+    stream = io.BytesIO(atom_feed(['one', 'two', 'three']).encode('utf-8'))
+    articles = openai_utils.process_user_feed(stream)
+
+    assert [a['title'] for a in articles] == ['Title 0', 'Title 1', 'Title 2']
+
+
+# parser tests
+
+from parsers.xml_parser import iter_user_xml, parse_user_xml
+
+def test_parse_rss_items():
+    xml = '<rss><channel><item><title>Test Article</title><description>Test Description</description><link>http://example.com</link></item></channel></rss>'
+    assert parse_user_xml(xml) == [{'title': 'Test Article', 'content': 'Test Description', 'url': 'http://example.com'}]
+
+def test_parse_repairs_html_entities():
+    xml = '<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>Q&amp;A &mdash; AT&T</title><link rel="self" href="http://example.com/self"/><link href="http://example.com/post"/></entry></feed>'
+    articles = parse_user_xml(xml)
+    assert articles == [{'title': 'Q&A — AT&T', 'content': '', 'url': 'http://example.com/post'}]
+
+def test_iter_user_xml_reads_small_chunks():
+    chunks = [atom_feed(['a', 'b'])[i:i + 7].encode('utf-8') for i in range(0, len(atom_feed(['a', 'b'])), 7)]
+    assert [a['content'] for a in iter_user_xml(chunks)] == ['a', 'b']
+
+def test_batched_translate_retries_missing_ids(fake_openai):
+    articles = [
+        {'title': f'title {i}', 'content': 'body', 'summary': 'sum', 'url': str(i)} for i in range(4)
+    ]
+    articles[2]['title'] = 'skip me'
+    translated = openai_utils.translate_feed(articles, 'French', token_budget=10000)
+
+    assert [a['title'] for a in translated] == ['TITLE 0', 'TITLE 1', 'skip me', 'TITLE 3']
+    assert [a['url'] for a in translated] == ['0', '1', '2', '3']
+    # one batched request plus one per-article retry
+    assert fake_openai.calls == 2
+
+def test_pack_batches_respects_token_budget():
+    articles = [{'title': 't', 'content': 'x' * 400} for _ in range(5)]
+    batches = pack_batches(articles, ('title', 'content'), 250)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [item_id for batch in batches for item_id, _, _ in batch] == ['0', '1', '2', '3', '4']
+
+def test_article_store_only_summarizes_new_or_changed_entries(fake_openai, tmp_path):
+    store = ArticleStore(str(tmp_path / 'articles.db'))
+    with patch.object(openai_utils, 'get_article_store', lambda: store):
+        openai_utils.process_user_feed(atom_feed(['one', 'two']))
+        assert fake_openai.calls == 2
+
+        articles = openai_utils.process_user_feed(atom_feed(['one', 'two edited', 'three']))
+
+    assert fake_openai.calls == 4
+    assert store.stats() == {'processed': 2, 'skipped': 1, 'entries': 3}
+    assert articles[0]['summary'].endswith('one')
+    assert articles[1]['summary'].endswith('two edited')
+    store.close()
+
+
+def test_article_store_keeps_entries_reused_before_compaction(tmp_path):
+    store = ArticleStore(str(tmp_path / 'articles.db'), retention_days=1)
+    old, dropped = {'title': 'Old', 'content': 'body', 'url': 'a'}, {'title': 'Gone', 'content': 'body', 'url': 'b'}
+    with patch('data_structures.article_store.time.time', return_value=0):
+        store.save_summary(old, 'summary')
+        store.save_summary(dropped, 'summary')
+    # The reuse is only recorded in memory until compact() writes it
+    assert store.get_summary(old) == 'summary'
+
+    assert store.compact() == 1
+    assert store.get_summary(old) == 'summary'
+    assert store.get_summary(dropped) is None
+    store.close()
+
+
+# relevance pre-screen tests
+
+from ai.prescreen import prescreen
+
+def test_prescreen_splits_articles_into_bands(fake_openai):
+    articles = [
+        {'title': 'Python 3.13 released', 'content': 'The new python release speeds up python code.', 'summary': '', 'url': 'a'},
+        {'title': 'Gardening tips', 'content': 'How to grow tomatoes.', 'summary': '', 'url': 'b'},
+        {'title': 'Weekly roundup', 'content': 'Links about rust, go, python and more ' + 'filler ' * 40, 'summary': '', 'url': 'c'},
+    ]
+    assert prescreen(articles, 'Python', reject_threshold=0.0) == [True, False, None]
+    # Rejection is opt-in: by default everything below the accept band goes to the LLM
+    assert prescreen(articles, 'Python') == [True, None, None]
+
+    filtered = openai_utils.filter_feed(articles, 'Python')
+    assert [a['url'] for a in filtered] == ['a']
+    assert fake_openai.calls == 2
+
+def test_prescreen_keeps_articles_with_other_inflections(fake_openai):
+    articles = [{'title': 'Election results', 'content': 'The election was close.', 'summary': '', 'url': 'a'}]
+    assert prescreen(articles, 'elections') == [None]
+    # The article is not dropped locally; the LLM gets to decide
+    openai_utils.filter_feed(articles, 'elections')
+    assert fake_openai.calls == 1
+
+
+# feed fetcher tests
+
+from utils.feed_fetcher import FeedFetcher
+
+def test_fetcher_sends_validators_and_skips_unchanged_feed(tmp_path):
+    fetcher = FeedFetcher(validator_path=str(tmp_path / 'validators.json'))
+    first = MagicMock(status_code=200, headers={'ETag': '"v1"'})
+    first.iter_content.return_value = [atom_feed(['a']).encode('utf-8')]
+    unchanged = MagicMock(status_code=304, headers={})
+
+    with patch.object(fetcher.session, 'get', side_effect=[first, unchanged]) as mock_get:
+        [result] = fetcher.fetch_all(['http://example.com/feed'])
+        assert result.status == 200 and len(result.articles) == 1
+
+        reloaded = FeedFetcher(validator_path=str(tmp_path / 'validators.json'))
+        reloaded.session = fetcher.session
+        [result] = reloaded.fetch_all(['http://example.com/feed'])
+
+    assert result.status == 304 and result.articles == []
+    assert mock_get.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+    unchanged.iter_content.assert_not_called()
+
+def test_fetcher_records_parse_time_of_streamed_feeds():
+    fetcher = FeedFetcher()
+    response = MagicMock(status_code=200, headers={})
+    response.iter_content.return_value = [atom_feed(['a', 'b']).encode('utf-8')]
+    registry = Metrics()
+
+    with patch.object(fetcher.session, 'get', return_value=response), \
+            patch('parsers.xml_parser.metrics', registry), patch('utils.feed_fetcher.metrics', registry):
+        result = fetcher.fetch('http://example.com/feed')
+
+    assert len(result.articles) == 2
+    histograms = {histogram['name']: histogram for histogram in registry.snapshot()['histograms']}
+    assert histograms['parse_seconds']['count'] == 1
+    assert histograms['fetch_seconds']['count'] == 1
+
+def test_fetcher_holds_back_validators_until_committed(tmp_path):
+    fetcher = FeedFetcher(validator_path=str(tmp_path / 'validators.json'))
+    response = MagicMock(status_code=200, headers={'ETag': '"v2"'})
+    response.iter_content.return_value = [atom_feed(['a']).encode('utf-8')]
+
+    with patch.object(fetcher.session, 'get', return_value=response):
+        fetcher.fetch('http://example.com/feed', remember_validators=False)
+    assert fetcher.validators == {}
+
+    fetcher.commit_validators('http://example.com/feed')
+    assert fetcher.validators == {'http://example.com/feed': {'etag': '"v2"', 'last_modified': None}}
+
+
+# transform plan tests
+
+from ai.plan import TransformPlan
+
+def test_plan_filters_first_fuses_rewrites_and_memoizes():
+    articles = [{'title': f't{i}', 'content': '', 'summary': '', 'url': str(i)} for i in range(4)]
+    filter_fn = MagicMock(side_effect=lambda items, keyword: items[:2])
+    translate_fn = MagicMock(side_effect=lambda items, language: [dict(a, title=a['title'] + language) for a in items])
+    rewrite_fn = MagicMock(side_effect=lambda items, steps: [dict(a, title='fused') for a in items])
+    plan = TransformPlan(articles, filter_fn=filter_fn, translate_fn=translate_fn, slang_fn=MagicMock(), rewrite_fn=rewrite_fn)
+
+    plan.translate('fr')
+    plan.slang('pirate')
+    plan.filter('kw')
+    plan.translate('de')
+    result = plan.materialize()
+
+    assert [a['title'] for a in result] == ['fusedde', 'fusedde']
+    filter_fn.assert_called_once_with(articles, 'kw')
+    # all but the newest rewrite are fused into one request per article
+    rewrite_fn.assert_called_once_with(articles[:2], [('translate', 'fr'), ('slang', 'pirate')])
+    assert translate_fn.call_count == 1
+
+    # dropping the filter and the slang step leaves a plain translation of everything
+    assert plan.undo() == ('translate', 'de')
+    assert plan.undo() == ('filter', 'kw')
+    assert plan.undo() == ('slang', 'pirate')
+    assert [a['title'] for a in plan.materialize()] == ['t0fr', 't1fr', 't2fr', 't3fr']
+
+    # re-adding the filter reuses the memoized filter result
+    plan.undo()
+    plan.filter('kw')
+    assert plan.materialize() == articles[:2]
+    assert filter_fn.call_count == 1
+
+def test_plan_undoing_the_newest_rewrite_is_free(fake_openai):
+    articles = [{'title': f't{i}', 'content': 'body', 'summary': 's', 'url': str(i)} for i in range(3)]
+    plan = TransformPlan(articles)
+    plan.translate('French')
+    plan.slang('pirate')
+    plan.materialize()
+    calls = fake_openai.calls
+
+    assert plan.undo() == ('slang', 'pirate')
+    assert len(plan.materialize()) == 3
+    assert fake_openai.calls == calls
+
+
+# pre-processing tests
+
+from ai.preprocess import extract_text, prepare_content
+from xml.sax.saxutils import escape
+
+def test_extract_text_drops_markup_and_scripts():
+    html = '<div><p>Hello <b>world</b></p><script>var x = 1;</script><img src="a.png"/><p>Bye</p></div>'
+    assert extract_text(html) == 'Hello world Bye'
+
+def test_long_article_is_summarized_in_chunks(fake_openai):
+    content = '<p>' + ' '.join(f'word{i}' for i in range(2000)) + '</p>'
+    chunks, raw_tokens, sent_tokens = prepare_content(content, token_budget=1000, max_chunks=3)
+    assert len(chunks) > 1 and sent_tokens < raw_tokens
+
+    with patch('ai.preprocess.SUMMARY_TOKEN_BUDGET', 1000):
+        summary = openai_utils.ai_summarize(content)
+    # one request per chunk plus the combining request
+    assert fake_openai.calls == len(prepare_content(content, token_budget=1000)[0]) + 1
+    assert summary.startswith('Reply to: These are summaries')
+
+
+def test_chunk_requests_stay_within_feed_concurrency(fake_openai):
+    create = fake_openai.create
+    active = 0
+    peak = 0
+
+    async def tracked_create(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            return await create(**kwargs)
+        finally:
+            active -= 1
+
+    fake_openai.create = tracked_create
+    contents = ['<p>' + ' '.join(f'word{i}x{n}' for i in range(2000)) + '</p>' for n in range(8)]
+    with patch('ai.preprocess.SUMMARY_TOKEN_BUDGET', 500):
+        articles = openai_utils.process_user_feed(atom_feed(contents), concurrency=2, dedup_threshold=0)
+
+    assert all(article['summary'].startswith('Reply to: These are summaries') for article in articles)
+    assert peak == 2
+
+
+def test_each_article_is_cleaned_once(fake_openai):
+    from bs4 import BeautifulSoup
+    contents = [f'<p>story {i} <b>body</b></p>' for i in range(4)]
+    sources = parse_user_xml(atom_feed([escape(content) for content in contents]))
+    with patch('ai.preprocess.BeautifulSoup', wraps=BeautifulSoup) as soup:
+        articles = openai_utils.process_user_feed(sources)
+        build_keyword_index(articles, KeywordIndex(), sources=sources)
+    # Shared by near-duplicate detection, summarization and keyword extraction
+    assert soup.call_count == 4
+    assert articles[0]['summary'].endswith('story 0 body')
+    assert all('clean_content' not in article for article in articles)
+
+
+# metrics tests
+
+from utils.metrics import Metrics
+
+def test_metrics_snapshot_and_prometheus_export():
+    registry = Metrics()
+    registry.observe('llm_request_seconds', 0.2, stage='summarize')
+    registry.observe('llm_request_seconds', 0.4, stage='summarize')
+    registry.record_usage(SimpleNamespace(prompt_tokens=100, completion_tokens=20), stage='summarize')
+
+    [histogram] = registry.snapshot()['histograms']
+    assert histogram['count'] == 2 and histogram['p50'] == 0.2 and histogram['p95'] == 0.4
+
+    text = registry.to_prometheus()
+    assert 'rss_llm_prompt_tokens_total{stage="summarize"} 100' in text
+    assert 'rss_llm_request_seconds_bucket{stage="summarize",le="0.25"} 1' in text
+    assert 'rss_llm_request_seconds_count{stage="summarize"} 2' in text
+
+
+# batch runner tests
+
+from batch import BatchRunner, JsonlWriter, parse_chain
+from utils.feed_fetcher import FeedResult
+
+def test_parse_chain_rejects_unknown_steps():
+    assert parse_chain([{'filter': 'AI'}, {'slang': 'pirate'}]) == [('filter', 'AI'), ('slang', 'pirate')]
+    with pytest.raises(ValueError):
+        parse_chain([{'summarize': 'x'}])
+
+@pytest.fixture
+def batch_fetcher():
+    return MagicMock()
+
+@pytest.fixture
+def run_batch(fake_openai, batch_fetcher, tmp_path, monkeypatch):
+    """Run one BatchRunner cycle over {url: [article, ...]} and return the written records."""
+    monkeypatch.setenv('ARTICLE_STORE_PATH', str(tmp_path / 'articles.db'))
+
+    def run_batch(feeds_by_url, chain=(), **runner_kwargs):
+        batch_fetcher.fetch.side_effect = lambda url, **kwargs: FeedResult(url, 200, feeds_by_url[url], None)
+        writer = JsonlWriter(str(tmp_path / 'out.jsonl'))
+
+        async def run():
+            async with openai_utils.async_client_scope():
+                await BatchRunner(list(feeds_by_url), parse_chain(chain), writer, batch_fetcher, **runner_kwargs).run()
+
+        asyncio.run(run())
+        writer.close()
+        return [json.loads(line) for line in (tmp_path / 'out.jsonl').read_text().splitlines()]
+
+    return run_batch
+
+def test_batch_runner_streams_jsonl(fake_openai, run_batch):
+    feeds = {
+        url: [{'title': 'Python news', 'content': 'python python release', 'url': url + '/1'},
+              {'title': 'Cooking', 'content': 'tomato soup', 'url': url + '/2'}]
+        for url in ('http://a', 'http://b')
+    }
+    # Both feeds carry the same articles; keep them from being deduplicated
+    records = run_batch(feeds, [{'translate': 'French'}, {'filter': 'python'}], dedup_threshold=0)
+
+    assert sorted(record['url'] for record in records) == ['http://a/1', 'http://b/1']
+    assert all(record['summarized'] for record in records)
+    # per feed: one relevance check for the article not accepted locally, then
+    # one summary and one translation of the kept article
+    assert fake_openai.calls == 6
+
+def test_batch_runner_retries_feeds_with_failed_summaries(run_batch, batch_fetcher):
+    records = run_batch({
+        'http://good': [{'title': 'Ok', 'content': 'fine body', 'url': 'http://good/1'},
+                        {'title': 'Broken', 'content': 'other body', 'url': 'http://good/2'}],
+        'http://bad': [{'title': 'Ok', 'content': 'fine body', 'url': 'http://bad/1'},
+                       {'title': 'Broken', 'content': 'fail', 'url': 'http://bad/2'}],
+    })
+
+    assert sorted(record['url'] for record in records) == ['http://bad/1', 'http://good/1', 'http://good/2']
+    assert all(record['summary'] != openai_utils.SUMMARY_UNAVAILABLE for record in records)
+    # Only the feed whose articles all succeeded keeps its ETag/Last-Modified
+    batch_fetcher.commit_validators.assert_called_once_with('http://good')
+
+def test_batch_runner_summarizes_a_story_once_across_feeds(fake_openai, run_batch):
+    story = ' '.join(f'word{i}' for i in range(80))
+    records = run_batch({
+        url: [{'title': 'Story', 'content': story, 'url': url + '/story'},
+              {'title': 'Local', 'content': f'news only {url} has', 'url': url + '/local'}]
+        for url in ('http://a', 'http://b')
+    })
+
+    records = {record['url']: record for record in records}
+    assert len(records) == 4
+    assert fake_openai.calls == 3
+    copy = records['http://b/story'] if 'duplicate_of' in records['http://b/story'] else records['http://a/story']
+    assert copy['summary'] == records[copy['duplicate_of']]['summary']
+    assert not copy['summarized']
+
+
+# near-duplicate detection tests
+
+from ai.dedup import NearDuplicateIndex
+
+STORY = ' '.join(f'word{i}' for i in range(80))
+
+def test_near_duplicates_share_one_summary(fake_openai):
+    edited = STORY.replace('word40', 'edited')
+    articles = openai_utils.process_user_feed(atom_feed([STORY, 'an unrelated story about gardening', edited]))
+
+    assert fake_openai.calls == 2
+    assert articles[2]['summary'] == articles[0]['summary']
+    assert articles[2]['duplicate_of'] == 'http://example.com/0'
+    assert articles[0]['duplicates'] == ['http://example.com/2']
+    assert 'duplicate_of' not in articles[1]
+
+def test_slang_keeps_duplicate_links(fake_openai):
+    articles = openai_utils.process_user_feed(atom_feed([STORY, STORY.replace('word40', 'edited')]))
+    slang = openai_utils.apply_slang(articles, 'pirate', token_budget=0)
+
+    assert slang[0]['duplicates'] == ['http://example.com/1']
+    assert slang[1]['duplicate_of'] == 'http://example.com/0'
+    assert slang[0]['title'] != articles[0]['title']
+
+def test_near_duplicate_threshold_is_tunable():
+    story = {'title': 'Story', 'content': STORY}
+    rewritten = {'title': 'Story', 'content': ' '.join(STORY.split()[:60]) + ' a different ending altogether'}
+
+    loose = NearDuplicateIndex(threshold=0.5)
+    loose.add(0, story)
+    assert loose.add(1, rewritten) == 0
+
+    strict = NearDuplicateIndex(threshold=0.95)
+    strict.add(0, story)
+    assert strict.add(1, rewritten) is None
+    assert strict.duplicate_clusters() == {}
+
+
+# progressive output tests
+
+def test_summaries_are_reported_as_they_complete(fake_openai):
+    seen = []
+    articles = openai_utils.process_user_feed(
+        atom_feed([f'body {i}' for i in range(6)]),
+        concurrency=2,
+        on_result=lambda idx, article: seen.append((idx, article['summary']))
+    )
+
+    assert sorted(seen) == [(idx, article['summary']) for idx, article in enumerate(articles)]
+    assert articles[3]['summary'] == 'Reply to: Summarize this article in 2-3 sentences: body 3'
+
+def test_streamed_replies_record_first_token_latency(fake_openai):
+    registry = Metrics()
+    with patch.object(openai_utils, 'metrics', registry):
+        assert openai_utils.ai_summarize('some text').endswith('some text')
+    names = [histogram['name'] for histogram in registry.snapshot()['histograms']]
+    assert 'llm_first_token_seconds' in names
+
+
+# keyword index tests
+
+from ai.keywords import build_keyword_index, extract_keywords
+from data_structures.keyword_index import KeywordIndex
+
+def test_extract_keywords_prefers_title_terms():
+    article = {'title': 'Quantum computing milestone', 'summary': 'Researchers report a quantum computing result.', 'content': '<p>The lab said the result was reproducible.</p>'}
+    keywords = extract_keywords(article, max_keywords=3)
+    assert keywords[0] == 'quantum computing'
+    assert 'the' not in extract_keywords(article)
+
+def test_keyword_index_add_remove_and_lookup():
+    index = KeywordIndex()
+    index.add({'title': 'A', 'summary': 's', 'url': 'a'}, ['python', 'pytest'])
+    index.add({'title': 'B', 'summary': 's', 'url': 'b'}, ['python', 'rust'])
+    index.add({'title': 'A2', 'summary': 's', 'url': 'a'}, ['pandas'])
+
+    assert index.keywords('py') == (1, [('python', 1)])
+    assert index.keywords(offset=1, limit=2) == (3, [('python', 1), ('rust', 1)])
+    assert [a['title'] for a in index.articles('pandas')] == ['A2']
+    assert index.fuzzy('pyhton') == [('python', 1)]
+    assert index.remove({'url': 'b'})
+    assert index.keywords() == (1, [('pandas', 1)])
+
+def test_keyword_index_round_trips_through_disk(tmp_path):
+    articles = [{'title': f'Rust release {i}', 'summary': 'Rust compiler news.', 'content': '', 'url': str(i)} for i in range(3)]
+    index = KeywordIndex()
+    assert build_keyword_index(articles, index) == 3
+    index.remove(articles[1])
+    index.save(str(tmp_path / 'keywords.npz'))
+
+    loaded = KeywordIndex.load(str(tmp_path / 'keywords.npz'))
+    assert loaded.keywords() == index.keywords()
+    assert [a['url'] for a in loaded.articles('rust')] == ['0', '2']
+    assert build_keyword_index(articles, loaded) == 1
+    assert loaded.count('rust') == 3
+
+
+def test_keyword_index_compacts_old_and_excess_articles():
+    index = KeywordIndex(retention_days=1, max_entries=2)
+    with patch('data_structures.keyword_index.time.time', return_value=0):
+        index.add({'title': 'Old', 'summary': 's', 'url': 'old'}, ['old'])
+    for name in ('a', 'b', 'c'):
+        index.add({'title': name, 'summary': 's', 'url': name}, ['news'])
+
+    assert index.compact() == 2
+    assert [a['url'] for a in index.articles('news')] == ['b', 'c']
+    assert index.count('old') == 0
+
+def test_keyword_index_rebuilds_truncated_file(tmp_path, monkeypatch):
+    path = tmp_path / 'keywords.npz'
+    index = KeywordIndex()
+    index.add({'title': 'A', 'summary': 's', 'url': 'a'}, ['python'])
+    index.save(str(path))
+    path.write_bytes(path.read_bytes()[:100])
+    monkeypatch.setenv('KEYWORD_INDEX_PATH', str(path))
+
+    rebuilt = KeywordIndex.from_env()
+    assert len(rebuilt) == 0 and rebuilt.path == str(path)
+
+
+# request scheduler tests
+
+import openai
+from ai.scheduler import CircuitOpenError, parse_duration
+
+def api_error(error_class, status, headers=None):
+    response = SimpleNamespace(status_code=status, headers=headers or {}, request=None)
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+def test_rate_limited_requests_are_retried_after_retry_after(fake_openai):
+    create = fake_openai.create
+    failures = [api_error(openai.RateLimitError, 429, {'retry-after-ms': '20'})] * 2
+
+    async def flaky_create(**kwargs):
+        if failures:
+            raise failures.pop()
+        return await create(**kwargs)
+
+    fake_openai.create = flaky_create
+    assert openai_utils.ai_summarize('text').endswith('text')
+    assert fake_openai.calls == 1
+
+def test_scheduler_serves_summaries_before_transforms():
+    scheduler = RequestScheduler(requests_per_minute=6000, tokens_per_minute=0)
+    scheduler.requests.level = 0
+    order = []
+
+    async def request(stage):
+        await scheduler.acquire(10, stage)
+        order.append(stage)
+
+    async def run():
+        first = asyncio.create_task(request('translate'))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, request('summarize'))
+
+    asyncio.run(run())
+    assert order == ['summarize', 'translate']
+
+def test_scheduler_opens_circuit_after_repeated_server_errors():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, circuit_failures=2, circuit_cooldown=60)
+    scheduler.retry_delay(api_error(openai.InternalServerError, 500), 0)
+    scheduler.retry_delay(api_error(openai.InternalServerError, 500), 1)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(scheduler.acquire(10))
+
+def test_scheduler_fails_fast_on_exhausted_quota():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, circuit_cooldown=60)
+    response = SimpleNamespace(status_code=429, headers={}, request=None)
+    error = openai.RateLimitError("HTTP 429", response=response, body={'code': 'insufficient_quota'})
+
+    assert scheduler.retry_delay(error, 0) is None
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(scheduler.acquire(10))
+
+def test_half_open_circuit_lets_one_probe_through():
+    scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, circuit_failures=1, circuit_cooldown=60)
+    scheduler.retry_delay(api_error(openai.InternalServerError, 500), 0)
+    scheduler.open_until = 0.0
+    admitted = []
+
+    async def request(name):
+        await scheduler.acquire(10)
+        admitted.append(name)
+
+    async def run():
+        waiter = asyncio.create_task(request('waiter'))
+        await request('probe')
+        await asyncio.sleep(0.05)
+        assert admitted == ['probe']
+        # The probe fails: the waiting request is turned away and the circuit is open again
+        scheduler.retry_delay(api_error(openai.InternalServerError, 500), 0)
+        with pytest.raises(CircuitOpenError):
+            await waiter
+
+    asyncio.run(run())
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(scheduler.acquire(10))
+
+def test_scheduler_follows_rate_limit_headers():
+    scheduler = RequestScheduler(requests_per_minute=500, tokens_per_minute=1000)
+    scheduler.record_response({'x-ratelimit-limit-requests': '60', 'x-ratelimit-remaining-requests': '0', 'x-ratelimit-limit-tokens': '90000'}, 100, 100)
+
+    assert scheduler.requests.capacity == 60
+    assert scheduler.requests.level <= 0
+    assert scheduler.tokens.capacity == 90000
+    assert parse_duration('6m0s') == 360 and parse_duration('250ms') == 0.25
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from parsers.xml_parser import CHUNK_SIZE, iter_user_xml, parse_user_xml
+from utils.metrics import metrics
+
+# status is the HTTP status code (304 when the feed is unchanged) or None if the request failed
+FeedResult = namedtuple('FeedResult', ['url', 'status', 'articles', 'error'])
+
+FEED_ACCEPT = 'application/atom+xml, application/rss+xml, application/xml;q=0.9, text/xml;q=0.9, */*;q=0.5'
+
+class FeedFetcher:
+    """Download many feeds concurrently over one pooled HTTP session.
+
+    With a validator_path, the ETag and Last-Modified headers of each feed are
+    stored on disk and sent back on the next fetch, so an unchanged feed is
+    answered with a 304 and skips parsing entirely. Callers that may fail to
+    process a feed fetch it with remember_validators=False and call
+    commit_validators() once they are done, so a failed feed is downloaded in
+    full again next time. Response bodies are streamed straight into the
+    incremental parser.
+    """
+
+    def __init__(self, validator_path=None, max_workers=8, timeout=(5, 30)):
+        self.validator_path = validator_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': FEED_ACCEPT, 'Accept-Encoding': 'gzip, deflate'})
+        self._lock = threading.Lock()
+        self.validators = self._load_validators()
+        self._pending = {}
+
+    def _load_validators(self):
+        if not self.validator_path or not os.path.exists(self.validator_path):
+            return {}
+        try:
+            with open(self.validator_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read feed validators from {self.validator_path}: {e}")
+            return {}
+
+    def save_validators(self):
+        if not self.validator_path:
+            return
+        with self._lock:
+            data = dict(self.validators)
+        tmp_path = f"{self.validator_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.validator_path)
+
+    def _conditional_headers(self, url):
+        headers = {}
+        with self._lock:
+            validators = self.validators.get(url, {})
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def _remember_validators(self, url, response, remember):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        validators = {'etag': etag, 'last_modified': last_modified} if etag or last_modified else None
+        with self._lock:
+            if not remember:
+                self._pending[url] = validators
+            elif validators:
+                self.validators[url] = validators
+            else:
+                self.validators.pop(url, None)
+
+    def commit_validators(self, url):
+        """Keep the validators of a feed fetched with remember_validators=False."""
+        with self._lock:
+            if url not in self._pending:
+                return
+            validators = self._pending.pop(url)
+            if validators:
+                self.validators[url] = validators
+            else:
+                self.validators.pop(url, None)
+
+    def fetch(self, url, remember_validators=True):
+        # Timed as a whole: the body is parsed while it is being downloaded
+        with metrics.timer('fetch_seconds'):
+            result = self._fetch(url, remember_validators)
+        outcome = 'error' if result.error is not None else str(result.status)
+        metrics.increment('feeds_fetched_total', status=outcome)
+        return result
+
+    def _fetch(self, url, remember_validators=True):
+        conditional = bool(self.validator_path)
+        headers = self._conditional_headers(url) if conditional else {}
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            try:
+                if response.status_code == 304:
+                    logging.info(f"Feed not modified: {url}")
+                    return FeedResult(url, 304, [], None)
+                response.raise_for_status()
+                try:
+                    articles = list(iter_user_xml(response.iter_content(CHUNK_SIZE)))
+                except ET.ParseError as e:
+                    # The streaming parser cannot repair malformed markup, so fall
+                    # back to downloading the document whole for parse_user_xml
+                    logging.error(f"XML parsing error in {url}: {e}")
+                    retry = self.session.get(url, timeout=self.timeout)
+                    retry.raise_for_status()
+                    articles = parse_user_xml(retry.text)
+                if conditional:
+                    self._remember_validators(url, response, remember_validators)
+                logging.info(f"Fetched {len(articles)} entries from {url}")
+                return FeedResult(url, response.status_code, articles, None)
+            finally:
+                response.close()
+        except (requests.RequestException, ET.ParseError) as e:
+            logging.error(f"Error fetching feed {url}: {e}")
+            return FeedResult(url, None, [], e)
+
+    def fetch_all(self, urls):
+        """Fetch every URL concurrently and return their FeedResults in input order."""
+        urls = list(urls)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)) or 1) as executor:
+            results = list(executor.map(self.fetch, urls))
+        self.save_validators()
+        return results
+
+    def close(self):
+        self.session.close()
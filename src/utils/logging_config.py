@@ -1,11 +1,32 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+
+_listener = None
 
 def setup_logging():
+    # Records are handed to a queue and written by a background listener thread,
+    # so file and console I/O never blocks the code that logs
+    global _listener
+    if _listener is not None:
+        return _listener
+    log_queue = queue.SimpleQueue()
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler("app.log"),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The queue handler only merges message and arguments; the listener's handlers do the formatting
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("app.log"),
-            logging.StreamHandler()
-        ]
-    )
\ No newline at end of file
+        handlers=[queue_handler]
+    )
+    return _listener
@@ -0,0 +1,169 @@
+import contextlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Recent observations kept per histogram for the percentiles in the JSON snapshot
+MAX_SAMPLES = 10000
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.samples.append(value)
+        for idx, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[idx] += 1
+                break
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': _percentile(ordered, 0.5),
+            'p95': _percentile(ordered, 0.95),
+            'p99': _percentile(ordered, 0.99)
+        }
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in items) + '}'
+
+class Metrics:
+    """Thread-safe registry of latency histograms and counters for one run.
+
+    Timings are recorded with timer() or observe(), token usage and other
+    totals with increment(). At the end of a run the registry can be written
+    as a JSON snapshot or in the Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix='rss_'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_usage(self, usage, **labels):
+        # usage is the `usage` object of a chat completion response
+        if usage is None:
+            return
+        self.increment('llm_prompt_tokens_total', getattr(usage, 'prompt_tokens', 0) or 0, **labels)
+        self.increment('llm_completion_tokens_total', getattr(usage, 'completion_tokens', 0) or 0, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            histograms = [
+                dict(name=name, labels=dict(labels), **histogram.snapshot())
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {'timestamp': time.time(), 'histograms': histograms, 'counters': counters}
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = self.prefix + name
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = self.prefix + name
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} histogram")
+                    seen.add(metric)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        for histogram in snapshot['histograms']:
+            labels = ', '.join(f"{name}={value}" for name, value in histogram['labels'].items())
+            logging.info(
+                f"{histogram['name']}{f' ({labels})' if labels else ''}: {histogram['count']} calls, "
+                f"total {histogram['sum']:.2f}s, p50 {histogram['p50']:.3f}s, p95 {histogram['p95']:.3f}s"
+            )
+        for counter in snapshot['counters']:
+            labels = ', '.join(f"{name}={value}" for name, value in counter['labels'].items())
+            logging.info(f"{counter['name']}{f' ({labels})' if labels else ''}: {counter['value']}")
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+# Process-wide registry used by the fetcher, parser and OpenAI helpers
+metrics = Metrics()